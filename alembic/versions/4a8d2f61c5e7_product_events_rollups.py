@@ -0,0 +1,69 @@
+"""product event log and stats rollups
+
+Revision ID: 4a8d2f61c5e7
+Revises: e1f0b52c7a68
+Create Date: 2025-10-08 14:22:37.104215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a8d2f61c5e7'
+down_revision: Union[str, None] = 'e1f0b52c7a68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_events',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_product_events_occurred_at', 'product_events', ['occurred_at'], unique=False)
+    op.create_table(
+        'product_stats_hourly',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.Column('sales', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id', 'bucket'),
+    )
+    op.create_index('ix_product_stats_hourly_bucket', 'product_stats_hourly', ['bucket'], unique=False)
+    op.create_table(
+        'product_stats_daily',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.Column('sales', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id', 'day'),
+    )
+    op.create_index('ix_product_stats_daily_day', 'product_stats_daily', ['day'], unique=False)
+    op.create_table(
+        'job_cursors',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('position', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_cursors')
+    op.drop_index('ix_product_stats_daily_day', table_name='product_stats_daily')
+    op.drop_table('product_stats_daily')
+    op.drop_index('ix_product_stats_hourly_bucket', table_name='product_stats_hourly')
+    op.drop_table('product_stats_hourly')
+    op.drop_index('ix_product_events_occurred_at', table_name='product_events')
+    op.drop_table('product_events')
@@ -0,0 +1,47 @@
+"""order line unit prices and daily sales rollups
+
+Revision ID: 7c2e4f9a1b86
+Revises: b5e7193d2f40
+Create Date: 2025-10-13 09:41:18.275604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e4f9a1b86'
+down_revision: Union[str, None] = 'b5e7193d2f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('order_products', sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=True))
+    op.create_table(
+        'sales_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+    )
+    op.create_table(
+        'product_sales_daily',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id', 'day'),
+    )
+    op.create_index('ix_product_sales_daily_day', 'product_sales_daily', ['day'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_sales_daily_day', table_name='product_sales_daily')
+    op.drop_table('product_sales_daily')
+    op.drop_table('sales_daily')
+    op.drop_column('order_products', 'unit_price')
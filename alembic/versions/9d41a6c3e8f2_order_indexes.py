@@ -0,0 +1,39 @@
+"""order lookup indexes
+
+Revision ID: 9d41a6c3e8f2
+Revises: 2b7c9e41d0a3
+Create Date: 2025-09-24 16:02:47.118390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41a6c3e8f2'
+down_revision: Union[str, None] = '2b7c9e41d0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partial unique index: fails if two orders already share a PayPal id,
+    # which would have made webhook lookups ambiguous anyway.
+    op.create_index(
+        'ix_orders_paypal_order_id',
+        'orders',
+        ['paypal_order_id'],
+        unique=True,
+        postgresql_where=sa.text('paypal_order_id IS NOT NULL'),
+        sqlite_where=sa.text('paypal_order_id IS NOT NULL'),
+    )
+    op.create_index('ix_orders_user_id_date', 'orders', ['user_id', 'date'], unique=False)
+    op.create_index('ix_orders_status_date', 'orders', ['status', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_status_date', table_name='orders')
+    op.drop_index('ix_orders_user_id_date', table_name='orders')
+    op.drop_index('ix_orders_paypal_order_id', table_name='orders')
@@ -0,0 +1,49 @@
+"""order payments log; sales rollups count paid orders only
+
+Revision ID: a6d3e9c1f5b2
+Revises: f19c6a3e8d54
+Create Date: 2025-10-17 10:18:42.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d3e9c1f5b2'
+down_revision: Union[str, None] = 'f19c6a3e8d54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _reset_sales_rollups() -> None:
+    # The rollups are derived data; the sales worker recounts them from scratch
+    op.execute("DELETE FROM sales_daily")
+    op.execute("DELETE FROM product_sales_daily")
+    op.execute("UPDATE job_cursors SET position = 0 WHERE name = 'sales_rollup'")
+
+
+def upgrade() -> None:
+    op.create_table(
+        'order_payments',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('paid_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_order_payments_order_id'), 'order_payments', ['order_id'], unique=False)
+    # Orders paid before payments were logged count on the day they were placed
+    op.execute(
+        "INSERT INTO order_payments (order_id, paid_at) "
+        "SELECT id, COALESCE(date, CURRENT_TIMESTAMP) FROM orders WHERE status = 'COMPLETED' ORDER BY id"
+    )
+    _reset_sales_rollups()
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_order_payments_order_id'), table_name='order_payments')
+    op.drop_table('order_payments')
+    _reset_sales_rollups()
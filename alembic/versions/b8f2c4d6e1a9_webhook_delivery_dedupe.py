@@ -0,0 +1,48 @@
+"""dedupe webhook deliveries on (event id, transmission signature)
+
+Revision ID: b8f2c4d6e1a9
+Revises: a6d3e9c1f5b2
+Create Date: 2025-10-18 09:12:37.204615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8f2c4d6e1a9'
+down_revision: Union[str, None] = 'a6d3e9c1f5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQLite reflects unnamed unique constraints without a name; batch mode names them by this convention
+SQLITE_NAMING = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    unique = next(
+        uc["name"] for uc in sa.inspect(bind).get_unique_constraints('webhook_events') if uc["column_names"] == ['event_id']
+    )
+    if bind.dialect.name == "sqlite":
+        with op.batch_alter_table('webhook_events', naming_convention=SQLITE_NAMING) as batch_op:
+            batch_op.drop_constraint(unique or 'uq_webhook_events_event_id', type_='unique')
+            batch_op.add_column(sa.Column('transmission_sig', sa.Text(), nullable=False, server_default=''))
+    else:
+        op.drop_constraint(unique, 'webhook_events', type_='unique')
+        op.add_column('webhook_events', sa.Column('transmission_sig', sa.Text(), nullable=False, server_default=''))
+    op.create_index('ux_webhook_events_event_id_transmission_sig', 'webhook_events', ['event_id', 'transmission_sig'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_webhook_events_event_id_transmission_sig', table_name='webhook_events')
+    # Keep one delivery per event id so the old unique constraint can be restored
+    op.execute(
+        "DELETE FROM webhook_events WHERE id NOT IN ("
+        "SELECT MIN(id) FROM webhook_events GROUP BY event_id)"
+    )
+    with op.batch_alter_table('webhook_events') as batch_op:
+        batch_op.drop_column('transmission_sig')
+        batch_op.create_unique_constraint('webhook_events_event_id_key', ['event_id'])
@@ -0,0 +1,45 @@
+"""cart unique (user_id, product_id)
+
+Revision ID: c3e85a17b94d
+Revises: 9d41a6c3e8f2
+Create Date: 2025-09-26 11:37:21.604215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e85a17b94d'
+down_revision: Union[str, None] = '9d41a6c3e8f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fold duplicate rows into the oldest one before enforcing uniqueness
+    op.execute(
+        """
+        UPDATE cart SET quantity = (
+            SELECT SUM(c2.quantity) FROM cart c2
+            WHERE c2.user_id = cart.user_id AND c2.product_id = cart.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cart WHERE id NOT IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id
+        )
+        """
+    )
+    op.create_index('ux_cart_user_id_product_id', 'cart', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_cart_user_id_product_id', table_name='cart')
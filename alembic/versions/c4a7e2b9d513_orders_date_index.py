@@ -0,0 +1,26 @@
+"""index orders by date for the unfiltered order listing
+
+Revision ID: c4a7e2b9d513
+Revises: b8f2c4d6e1a9
+Create Date: 2025-10-18 11:40:05.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2b9d513'
+down_revision: Union[str, None] = 'b8f2c4d6e1a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_orders_date_id', 'orders', ['date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_date_id', table_name='orders')
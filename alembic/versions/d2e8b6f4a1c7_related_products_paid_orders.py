@@ -0,0 +1,33 @@
+"""related products count paid orders only
+
+Revision ID: d2e8b6f4a1c7
+Revises: c4a7e2b9d513
+Create Date: 2025-10-18 14:02:37.406118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2e8b6f4a1c7'
+down_revision: Union[str, None] = 'c4a7e2b9d513'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _reset_related_products() -> None:
+    # Pair counts are derived data; the related products worker recounts them
+    # from scratch (or run ``python -m app.cli rebuild-related``)
+    op.execute("DELETE FROM product_related")
+    op.execute("DELETE FROM product_pairs")
+    op.execute("DELETE FROM job_cursors WHERE name IN ('related_products_orders', 'related_products_payments')")
+
+
+def upgrade() -> None:
+    _reset_related_products()
+
+
+def downgrade() -> None:
+    _reset_related_products()
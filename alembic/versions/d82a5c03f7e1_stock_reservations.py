@@ -0,0 +1,49 @@
+"""stock reservations
+
+Revision ID: d82a5c03f7e1
+Revises: 7c2e4f9a1b86
+Create Date: 2025-10-14 16:08:54.913372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82a5c03f7e1'
+down_revision: Union[str, None] = '7c2e4f9a1b86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_reservations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stock_reservations_order_id', 'stock_reservations', ['order_id'], unique=False)
+    op.create_index(
+        'ix_stock_reservations_active_expires_at',
+        'stock_reservations',
+        ['expires_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'active'"),
+        sqlite_where=sa.text("status = 'active'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_reservations_active_expires_at', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_order_id', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
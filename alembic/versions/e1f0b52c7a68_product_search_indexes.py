@@ -0,0 +1,39 @@
+"""product search indexes
+
+Revision ID: e1f0b52c7a68
+Revises: c3e85a17b94d
+Create Date: 2025-09-30 09:48:12.275904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f0b52c7a68'
+down_revision: Union[str, None] = 'c3e85a17b94d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_price', 'products', ['price'], unique=False)
+    op.create_index('ix_product_categories_category_id', 'product_categories', ['category_id'], unique=False)
+    op.create_index('ix_cards_series', 'cards', ['series'], unique=False)
+    op.create_index('ix_cards_rarity', 'cards', ['rarity'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)')
+        op.execute("CREATE INDEX ix_products_name_fts ON products USING gin (to_tsvector('simple', name))")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_products_name_fts')
+        op.execute('DROP INDEX IF EXISTS ix_products_name_trgm')
+    op.drop_index('ix_cards_rarity', table_name='cards')
+    op.drop_index('ix_cards_series', table_name='cards')
+    op.drop_index('ix_product_categories_category_id', table_name='product_categories')
+    op.drop_index('ix_products_price', table_name='products')
@@ -0,0 +1,40 @@
+"""precompressed media variants
+
+Revision ID: e4b19d7c5a20
+Revises: d82a5c03f7e1
+Create Date: 2025-10-15 10:27:33.508127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b19d7c5a20'
+down_revision: Union[str, None] = 'd82a5c03f7e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('product_media', sa.Column('data_gzip', sa.LargeBinary(), nullable=True))
+    op.add_column('product_media', sa.Column('data_br', sa.LargeBinary(), nullable=True))
+    # Existing files start out NULL and are picked up by the compression worker
+    op.add_column('product_media', sa.Column('compressed_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_product_media_uncompressed',
+        'product_media',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('compressed_at IS NULL'),
+        sqlite_where=sa.text('compressed_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_media_uncompressed', table_name='product_media')
+    op.drop_column('product_media', 'compressed_at')
+    op.drop_column('product_media', 'data_br')
+    op.drop_column('product_media', 'data_gzip')
@@ -0,0 +1,36 @@
+"""cache entries for landing-page data
+
+Revision ID: f19c6a3e8d54
+Revises: e4b19d7c5a20
+Create Date: 2025-10-16 13:52:09.664718
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19c6a3e8d54'
+down_revision: Union[str, None] = 'e4b19d7c5a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cache_entries',
+        sa.Column('key', sa.String(length=128), nullable=False),
+        sa.Column('value', sa.LargeBinary(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('lease_owner', sa.String(length=64), nullable=True),
+        sa.Column('lease_until', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cache_entries')
@@ -3,10 +3,14 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+import hashlib
+import hmac
+import time
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from . import schemas, models, crud
+from . import database
 from .database import get_db
 from .security import hash_password, verify_password
 
@@ -16,6 +20,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 # Function to create a JWT token
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -56,11 +61,41 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         raise credentials_exception
     return user
 
+# The current user for routes open to guests too: None without a token (a bad token is still a 401)
+def get_optional_user(db: Session = Depends(get_db), token: Optional[str] = Depends(optional_oauth2_scheme)):
+    if token is None:
+        return None
+    return get_current_user(db, token)
+
 # Function to get the current active user
 def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     return current_user
 
-def admin_required(current_user: models.User = Depends(get_current_active_user)):
+# Primary-pin cookie values are "<unix expiry>.<HMAC>", so visitors cannot pin themselves
+def _primary_pin_signature(until: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"{database.PRIMARY_PIN_COOKIE}:{until}".encode(), hashlib.sha256).hexdigest()
+
+def primary_pin_value(until: int) -> str:
+    return f"{until}.{_primary_pin_signature(str(until))}"
+
+def primary_pin_active(value: Optional[str]) -> bool:
+    until, _, signature = (value or "").partition(".")
+    return (
+        until.isdigit()
+        and int(until) > time.time()
+        and hmac.compare_digest(signature, _primary_pin_signature(until))
+    )
+
+def admin_required(request: Request, response: Response, current_user: models.User = Depends(get_current_active_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
+    if request.method != "GET" and database.read_engine is not database.engine:
+        # Read-your-writes: pin this browser's catalog reads to the primary until the replica catches up
+        response.set_cookie(
+            database.PRIMARY_PIN_COOKIE,
+            primary_pin_value(int(time.time()) + database.READ_YOUR_WRITES_SECONDS),
+            max_age=database.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
     return current_user    
\ No newline at end of file
@@ -0,0 +1,53 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    """Run ``func`` in daemon threads until stopped.
+
+    ``func`` is called in a loop; when it returns a truthy value (work was
+    done) it is called again immediately, otherwise the thread sleeps for
+    ``interval`` seconds or until ``wake()`` is called.
+    """
+
+    def __init__(self, name: str, func, interval: float, threads: int = 1):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.threads = max(1, int(threads))
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.threads):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                busy = self.func()
+            except Exception:
+                logger.exception("%s iteration failed", self.name)
+                busy = False
+            if busy:
+                continue
+            self._wake.wait(self.interval)
+            self._wake.clear()
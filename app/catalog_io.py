@@ -0,0 +1,211 @@
+"""Streaming bulk import and export of the product catalog as CSV or JSONL.
+
+Both formats use the columns in EXPORT_FIELDS, one product per row or line;
+``type`` (base, 3d, card or manual) selects the subtype and the schema each
+row is validated against. Rows whose ``id`` names an existing product update
+it, other rows are inserted. Imports are read, validated and written
+IMPORT_CHUNK_SIZE rows at a time (one commit per chunk), and exports stream
+from a server-side cursor, so memory stays flat for any catalog size.
+
+A bad row only rejects itself: rows failing validation are reported by line,
+and a chunk the database refuses (e.g. a numeric overflow) is rolled back
+and retried row by row so only the offending rows are reported. A file that
+stops being valid UTF-8 ends the import at that line, keeping what was
+written before it.
+"""
+
+import csv
+import io
+import json
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas, serialization
+from .database import SessionLocal
+
+FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = (
+    "id", "type", "name", "quantity", "price", "discount", "discounted_price", "is_visible",
+    "height", "length", "width",
+    "series", "rarity", "condition",
+    "page_count", "language", "format",
+)
+SCHEMAS = {
+    "base": schemas.ProductCreate,
+    "3d": schemas.Product3DCreate,
+    "card": schemas.CardCreate,
+    "manual": schemas.ManualCreate,
+}
+IMPORT_CHUNK_SIZE = int(os.getenv("CATALOG_IMPORT_CHUNK_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("CATALOG_EXPORT_BATCH_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 100
+
+
+def guess_format(filename) -> str:
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return "jsonl" if ext in ("jsonl", "ndjson", "json") else "csv"
+
+
+def _utf8_lines(binary, invalid: list):
+    """Decode lines until one is not UTF-8, then stop and append True to ``invalid``."""
+    for line_no, line in enumerate(binary, 1):
+        try:
+            yield line.decode("utf-8-sig" if line_no == 1 else "utf-8")
+        except UnicodeDecodeError:
+            invalid.append(True)
+            return
+
+
+def read_records(binary, fmt: str):
+    """Yield (line number, dict or error message) from a binary file object."""
+    if fmt == "csv":
+        invalid = []
+        reader = csv.DictReader(_utf8_lines(binary, invalid))
+        for row in reader:
+            yield reader.line_num, row
+        if invalid:
+            yield reader.line_num + 1, "invalid UTF-8; this line and the rest of the file were not imported"
+    else:
+        for line_no, line in enumerate(binary, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"invalid JSON: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def _error_text(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+def _db_error_text(e: SQLAlchemyError) -> str:
+    return str(getattr(e, "orig", None) or e).strip().splitlines()[0]
+
+
+def parse_record(record: dict):
+    """(id or None, validated subtype schema) for one row; raises ValueError."""
+    values = {k: (None if v == "" else v) for k, v in record.items() if k in EXPORT_FIELDS or k == "product_type"}
+    kind = values.pop("product_type", None) or values.pop("type", None)
+    values.pop("type", None)
+    schema = SCHEMAS.get(kind)
+    if schema is None:
+        raise ValueError(f"type must be one of {', '.join(SCHEMAS)}")
+    product_id = values.pop("id", None)
+    if product_id is not None:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError("id must be an integer")
+    values = {k: v for k, v in values.items() if v is not None}
+    try:
+        return product_id, schema(product_type=kind, **values)
+    except ValidationError as e:
+        raise ValueError(_error_text(e))
+
+
+def import_products(db: Session, records, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Validate and upsert (line, record) pairs from read_records in chunks."""
+    result = {"inserted": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def report(line_no, message):
+        result["error_count"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line_no, "error": message})
+
+    def flush(chunk):
+        # Within a chunk the last row for an id wins, as it would across chunks
+        by_key = {}
+        for line_no, product_id, product in chunk:
+            by_key[product_id if product_id is not None else ("new", line_no)] = (line_no, product_id, product)
+        rows = list(by_key.values())
+        try:
+            upsert(rows)
+        except SQLAlchemyError:
+            db.rollback()
+            # Find the rows the database refuses; the others are still written
+            for row in rows:
+                try:
+                    upsert([row])
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    report(row[0], f"rejected by the database: {_db_error_text(e)}")
+
+    def upsert(rows):
+        inserted, updated, errors = crud.bulk_upsert_products(db, [(pid, product) for _, pid, product in rows])
+        result["inserted"] += inserted
+        result["updated"] += updated
+        for index, message in errors:
+            report(rows[index][0], message)
+
+    chunk = []
+    for line_no, record in records:
+        if isinstance(record, str):
+            report(line_no, record)
+            continue
+        try:
+            product_id, product = parse_record(record)
+        except ValueError as e:
+            report(line_no, str(e))
+            continue
+        chunk.append((line_no, product_id, product))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
+
+
+def _export_query():
+    products = models.Product.__table__
+    three_d = models.ThreeDModel.__table__
+    cards = models.Card.__table__
+    manuals = models.Manual.__table__
+    return (
+        select(
+            products.c.id, products.c.type, products.c.name, products.c.quantity, products.c.price,
+            products.c.discount, products.c.discounted_price, products.c.is_visible,
+            three_d.c.height, three_d.c.length, three_d.c.width,
+            cards.c.series, cards.c.rarity, cards.c.condition,
+            manuals.c.page_count, manuals.c.language, manuals.c.format,
+        )
+        .outerjoin(three_d, three_d.c.id == products.c.id)
+        .outerjoin(cards, cards.c.id == products.c.id)
+        .outerjoin(manuals, manuals.c.id == products.c.id)
+        .order_by(products.c.id)
+    )
+
+
+def export_products(db: Session, fmt: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield the catalog as CSV text or JSONL bytes in blocks of ``batch_size`` rows."""
+    result = db.execute(_export_query().execution_options(stream_results=True, yield_per=batch_size))
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for rows in result.partitions():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for rows in result.partitions():
+            yield b"".join(serialization.dumps(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in rows)
+
+
+def stream_export(fmt: str):
+    """export_products on its own session, for StreamingResponse (outlives the request's session)."""
+    db = SessionLocal()
+    try:
+        yield from export_products(db, fmt)
+    finally:
+        db.close()
@@ -0,0 +1,134 @@
+"""Operational commands kept out of the web process' boot path.
+
+    python -m app.cli init-db           # create all tables on a fresh database and stamp Alembic head
+    python -m app.cli create-admin      # create the admin account (ADMIN_EMAIL / ADMIN_PASSWORD)
+    python -m app.cli rebuild-related   # recount "frequently bought together" from all paid orders
+    python -m app.cli rebuild-sales     # recount the daily sales rollups from all payments
+    python -m app.cli warm-cache [--loop]  # precompute landing-page data (--loop: run the refresher as a sidecar)
+    python -m app.cli import-catalog products.csv       # bulk upsert products from CSV / JSONL
+    python -m app.cli export-catalog -o products.jsonl  # dump the catalog (stdout by default)
+
+Existing databases are migrated with ``alembic upgrade head`` instead of init-db.
+"""
+
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from . import models
+from .database import SessionLocal, engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def init_db(stamp: bool = True):
+    models.Base.metadata.create_all(bind=engine)
+    if stamp:
+        from alembic import command
+        from alembic.config import Config
+
+        command.stamp(Config(ALEMBIC_INI), "head")
+
+
+def create_admin(email: str, password: str) -> bool:
+    """Create an admin user; returns False if the email is already registered."""
+    from .security import hash_password
+
+    db = SessionLocal()
+    try:
+        if db.query(models.User.id).filter(models.User.email == email).first():
+            return False
+        db.add(models.User(email=email, password=hash_password(password), is_admin=True))
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init = commands.add_parser("init-db", help="create tables on a fresh database")
+    init.add_argument("--no-stamp", action="store_true", help="do not mark the database as migrated to Alembic head")
+
+    admin = commands.add_parser("create-admin", help="create the admin account if it does not exist")
+    admin.add_argument("--email", default=os.getenv("ADMIN_EMAIL", "admin@example.com"))
+    admin.add_argument("--password", default=os.getenv("ADMIN_PASSWORD"), help="defaults to ADMIN_PASSWORD, else prompts")
+
+    commands.add_parser("rebuild-related", help="recount related products from all paid orders")
+    commands.add_parser("rebuild-sales", help="recount the daily sales rollups from every order payment")
+    warm = commands.add_parser("warm-cache", help="precompute the landing-page cache entries now")
+    warm.add_argument("--loop", action="store_true", help="keep refreshing ahead of expiry until interrupted")
+
+    importer = commands.add_parser("import-catalog", help="insert or update products from a CSV / JSONL file")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension")
+
+    exporter = commands.add_parser("export-catalog", help="write all products as CSV / JSONL")
+    exporter.add_argument("-o", "--output", help="defaults to stdout")
+    exporter.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the output extension, else csv")
+
+    args = parser.parse_args(argv)
+    if args.command == "init-db":
+        init_db(stamp=not args.no_stamp)
+        print("Database initialised.")
+    elif args.command == "create-admin":
+        password = args.password or getpass.getpass(f"Password for {args.email}: ")
+        if not password:
+            parser.error("an admin password is required")
+        if create_admin(args.email, password):
+            print(f"Admin user '{args.email}' created.")
+        else:
+            print(f"Admin user '{args.email}' already exists.")
+    elif args.command == "rebuild-related":
+        from . import recommendations
+
+        print(recommendations.rebuild())
+    elif args.command == "rebuild-sales":
+        from . import sales
+
+        print(sales.rebuild())
+    elif args.command == "warm-cache":
+        from . import landing_cache
+
+        for key, duration_ms in landing_cache.refresh_due(force=True).items():
+            print(f"{key}: {duration_ms} ms")
+        if args.loop:
+            landing_cache.worker.start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                landing_cache.worker.stop()
+    elif args.command == "import-catalog":
+        from . import catalog_io
+
+        db = SessionLocal()
+        try:
+            with open(args.path, "rb") as f:
+                result = catalog_io.import_products(db, catalog_io.read_records(f, args.format or catalog_io.guess_format(args.path)))
+        finally:
+            db.close()
+        for error in result["errors"]:
+            print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+        print(f"{result['inserted']} inserted, {result['updated']} updated, {result['error_count']} rejected.")
+        return 1 if result["error_count"] else 0
+    elif args.command == "export-catalog":
+        from . import catalog_io
+
+        fmt = args.format or catalog_io.guess_format(args.output)
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for block in catalog_io.stream_export(fmt):
+                out.write(block.encode() if isinstance(block, str) else block)
+        finally:
+            if args.output:
+                out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
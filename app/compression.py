@@ -0,0 +1,187 @@
+"""gzip / brotli Content-Encoding for media downloads and API responses.
+
+Compressible media (GLB/glTF, STL/OBJ, PDF, SVG) get gzip copies, and brotli
+copies when the optional ``brotli`` package is installed, stored next to
+the original bytes. The worker here makes them once, at maximum
+compression, shortly after upload (and works through files uploaded
+before). /media/{id} then sends the best stored variant the client's
+Accept-Encoding allows, at no CPU cost per request.
+
+CompressionMiddleware compresses JSON, NDJSON and CSV responses above
+COMPRESS_MIN_BYTES on the fly. Each body chunk is flushed as it is
+compressed, so streamed exports stay streamed.
+"""
+
+import gzip
+import logging
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import crud
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1").lower() in ("1", "true", "yes")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_CONTENT_TYPES = frozenset(
+    t.strip() for t in os.getenv("COMPRESS_CONTENT_TYPES", "application/json,application/x-ndjson,text/csv").split(",") if t.strip()
+)
+# On-the-fly levels favour speed; stored media variants use the maximum
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+MEDIA_GZIP_LEVEL = int(os.getenv("MEDIA_GZIP_LEVEL", "9"))
+MEDIA_BROTLI_QUALITY = int(os.getenv("MEDIA_BROTLI_QUALITY", "11"))
+# A variant is only kept if it is at most this fraction of the original size
+MEDIA_MAX_COMPRESSED_RATIO = float(os.getenv("MEDIA_MAX_COMPRESSED_RATIO", "0.9"))
+MEDIA_COMPRESSION_POLL_SECONDS = float(os.getenv("MEDIA_COMPRESSION_POLL_SECONDS", "300"))
+
+COMPRESSIBLE_MEDIA_EXTENSIONS = (".glb", ".gltf", ".stl", ".obj", ".pdf", ".svg")
+COMPRESSIBLE_MEDIA_TYPES = frozenset({
+    "model/gltf-binary", "model/gltf+json", "model/stl", "model/obj", "application/pdf", "image/svg+xml",
+})
+
+# Server preference when the client rates several encodings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def preferred_encodings(accept_encoding: str, available=ENCODINGS):
+    """Encodings from ``available`` the Accept-Encoding header allows, best first."""
+    q = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        q[name] = weight
+    wildcard = q.get("*", 0.0)
+    ranked = [(q.get(name, wildcard), -i, name) for i, name in enumerate(available)]
+    return [name for weight, _, name in sorted(ranked, reverse=True) if weight > 0]
+
+
+# --- Stored media variants ---
+
+def is_compressible(filename: str, content_type: str) -> bool:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return (
+        content_type in COMPRESSIBLE_MEDIA_TYPES
+        or content_type.startswith("text/")
+        or (filename or "").lower().endswith(COMPRESSIBLE_MEDIA_EXTENSIONS)
+    )
+
+
+def media_variants(data: bytes) -> dict:
+    """{"gzip": bytes, "br": bytes} for the variants worth storing for ``data``."""
+    variants = {"gzip": gzip.compress(data, compresslevel=MEDIA_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=MEDIA_BROTLI_QUALITY)
+    limit = len(data) * MEDIA_MAX_COMPRESSED_RATIO
+    return {encoding: body for encoding, body in variants.items() if len(body) <= limit}
+
+
+def compress_next_media() -> bool:
+    """Store the variants of one not yet compressed media file; False when none is left."""
+    db = SessionLocal()
+    try:
+        media = crud.claim_uncompressed_media(db)
+        if media is None:
+            return False
+        variants = media_variants(media.data) if is_compressible(media.filename, media.content_type) else {}
+        crud.set_media_variants(db, media, variants)
+        if variants:
+            logger.info("Media %s compressed: %s", media.id, ", ".join(f"{e} {len(b)} bytes" for e, b in variants.items()))
+        return True
+    finally:
+        db.close()
+
+
+worker = PeriodicWorker("media-compression", compress_next_media, interval=MEDIA_COMPRESSION_POLL_SECONDS)
+
+
+# --- On-the-fly response compression ---
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing COMPRESS_CONTENT_TYPES responses per Accept-Encoding.
+
+    Responses that already carry a Content-Encoding (e.g. precompressed
+    media) and single-chunk bodies under ``minimum_size`` are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, content_types=COMPRESS_CONTENT_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = content_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = preferred_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if not encodings:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if (
+                    content_type not in self.content_types
+                    or "content-encoding" in headers
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _StreamCompressor(encodings[0])
+                del headers["content-length"]
+                headers["content-encoding"] = compressor.encoding
+                headers.add_vary_header("Accept-Encoding")
+                await send(start)
+            await send({"type": "http.response.body", "body": compressor.compress(body, final=not more_body), "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,7 +1,11 @@
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import case, func, insert, literal, select, text, update
+from sqlalchemy.orm import Session, selectin_polymorphic, selectinload, undefer, with_polymorphic
+from sqlalchemy.exc import IntegrityError
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import heapq
+import math
 from . import models, schemas
 from .security import hash_password
 
@@ -22,6 +26,19 @@ def get_users(db: Session, skip: int = 0, limit: int = 10):
 
 # app/crud.py
 
+def _record_sales(db: Session, quantities: dict):
+    """Append sale events for {product_id: quantity} to the current transaction.
+
+    sold_count on products is brought up to date by the event rollup job.
+    """
+    if not quantities:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        insert(models.ProductEvent),
+        [{"product_id": pid, "kind": "sale", "quantity": qty, "occurred_at": now} for pid, qty in quantities.items()],
+    )
+
 def create_guest_order(db: Session, order: schemas.GuestOrderBase):
     db_order = models.Order(
         guest_email=order.guest_email,
@@ -30,19 +47,26 @@ def create_guest_order(db: Session, order: schemas.GuestOrderBase):
         status=order.status
     )
     db.add(db_order)
+    db.flush()
+
+    # Add products to the order at their current prices and log the sales
+    product_ids = {product.product_id for product in order.products}
+    unit_prices = dict(
+        db.query(models.Product.id, func.coalesce(models.Product.discounted_price, models.Product.price))
+        .filter(models.Product.id.in_(product_ids))
+        .all()
+    ) if product_ids else {}
+    quantities = {}
+    for product in order.products:
+        db.add(models.OrderProduct(
+            order_id=db_order.id, product_id=product.product_id, quantity=product.quantity,
+            unit_price=unit_prices.get(product.product_id),
+        ))
+        quantities[product.product_id] = quantities.get(product.product_id, 0) + product.quantity
+    _record_sales(db, quantities)
     db.commit()
     db.refresh(db_order)
-    
-    # Add products to the order and update sold counters
-    for product in order.products:
-        db_order_product = models.OrderProduct(order_id=db_order.id, product_id=product.product_id, quantity=product.quantity)
-        db.add(db_order_product)
-        # Update sold_count
-        db_product = db.query(models.Product).filter(models.Product.id == product.product_id).first()
-        if db_product:
-            db_product.sold_count = (db_product.sold_count or 0) + product.quantity
-    db.commit()
-    
+
     return db_order
 
 """Product and media CRUD helpers."""
@@ -71,23 +95,47 @@ def create_product(db: Session, product: schemas.ProductBase):
     db.refresh(db_product)
     return db_product
 
+# Loading strategies. schemas.Product exposes the subtype columns, so every
+# product query that feeds it must load them up front rather than one lazy
+# SELECT per row.
+PRODUCT_SUBTYPES = (models.ThreeDModel, models.Card, models.Manual)
+
+def _product_list_query(db: Session):
+    # Pages of products: the base SELECT stays on `products` (cheap to filter,
+    # sort and paginate), then one SELECT per subtype present on the page.
+    return db.query(models.Product).options(
+        selectin_polymorphic(models.Product, PRODUCT_SUBTYPES),
+        selectinload(models.Product.media),
+        selectinload(models.Product.categories),
+    )
+
+def _product_detail_query(db: Session):
+    # Single product: subtype tables are LEFT OUTER JOINed into the one SELECT.
+    poly = with_polymorphic(models.Product, PRODUCT_SUBTYPES)
+    return db.query(poly).options(
+        selectinload(poly.media),
+        selectinload(poly.categories),
+    )
+
 def get_product(db: Session, product_id: int):
     return (
-        db.query(models.Product)
-        .options(
-            selectinload(models.Product.media),
-            selectinload(models.Product.categories),
-        )
+        _product_detail_query(db)
         .filter(models.Product.id == product_id)
         .first()
     )
 
+def get_products_by_ids(db: Session, product_ids):
+    """Load products for a list page, returned in the order of ``product_ids``."""
+    if not product_ids:
+        return []
+    products = _product_list_query(db).filter(models.Product.id.in_(product_ids)).all()
+    by_id = {p.id: p for p in products}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
 def get_products(db: Session, skip: int = 0, limit: int = 10):
     return (
-        db.query(models.Product)
-        .options(
-            selectinload(models.Product.categories),
-        )
+        _product_list_query(db)
+        .order_by(models.Product.id)
         .offset(skip)
         .limit(limit)
         .all()
@@ -96,16 +144,141 @@ def get_products(db: Session, skip: int = 0, limit: int = 10):
 
 def get_visible_products(db: Session, skip: int = 0, limit: int = 10):
     return (
-        db.query(models.Product)
-        .options(
-            selectinload(models.Product.categories),
-        )
+        _product_list_query(db)
         .filter(models.Product.is_visible == True)
+        .order_by(models.Product.id)
         .offset(skip)
         .limit(limit)
         .all()
     )
 
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _product_search_conditions(
+    db: Session,
+    q: Optional[str] = None,
+    product_type: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    is_visible: Optional[bool] = None,
+    series: Optional[str] = None,
+    rarity: Optional[str] = None,
+    min_height: Optional[float] = None,
+    max_height: Optional[float] = None,
+    min_length: Optional[float] = None,
+    max_length: Optional[float] = None,
+    min_width: Optional[float] = None,
+    max_width: Optional[float] = None,
+):
+    """WHERE clauses on `products` for a search; subtype filters become id subqueries."""
+    product = models.Product
+    conditions = []
+    if q:
+        pattern = f"%{_escape_like(q.strip())}%"
+        name_match = product.name.ilike(pattern, escape="\\")
+        if db.get_bind().dialect.name == "postgresql":
+            # Full-text match (ix_products_name_fts) or substring match (ix_products_name_trgm)
+            tsquery = func.plainto_tsquery("simple", q)
+            conditions.append(func.to_tsvector("simple", product.name).op("@@")(tsquery) | name_match)
+        else:
+            conditions.append(name_match)
+    if product_type is not None:
+        conditions.append(product.type == product_type)
+    if category_id is not None:
+        categories = models.product_categories.c
+        conditions.append(product.id.in_(select(categories.product_id).where(categories.category_id == category_id)))
+    if min_price is not None:
+        conditions.append(product.price >= min_price)
+    if max_price is not None:
+        conditions.append(product.price <= max_price)
+    if is_visible is not None:
+        conditions.append(product.is_visible == is_visible)
+
+    cards = models.Card.__table__.c
+    card_filters = []
+    if series is not None:
+        card_filters.append(cards.series == series)
+    if rarity is not None:
+        card_filters.append(cards.rarity == rarity)
+    if card_filters:
+        conditions.append(product.id.in_(select(cards.id).where(*card_filters)))
+
+    models3d = models.ThreeDModel.__table__.c
+    dimension_filters = []
+    for column, low, high in (
+        (models3d.height, min_height, max_height),
+        (models3d.length, min_length, max_length),
+        (models3d.width, min_width, max_width),
+    ):
+        if low is not None:
+            dimension_filters.append(column >= low)
+        if high is not None:
+            dimension_filters.append(column <= high)
+    if dimension_filters:
+        conditions.append(product.id.in_(select(models3d.id).where(*dimension_filters)))
+    return conditions
+
+def _product_search_facets(db: Session, conditions):
+    product = models.Product
+    categories = models.product_categories.c
+    by_type = (
+        db.query(product.type, func.count(product.id))
+        .filter(*conditions)
+        .group_by(product.type)
+        .order_by(func.count(product.id).desc())
+        .all()
+    )
+    by_category = (
+        db.query(models.Category.id, models.Category.name, func.count(product.id))
+        .join(models.product_categories, categories.category_id == models.Category.id)
+        .join(product, product.id == categories.product_id)
+        .filter(*conditions)
+        .group_by(models.Category.id, models.Category.name)
+        .order_by(func.count(product.id).desc())
+        .all()
+    )
+    cards = models.Card.__table__
+    by_rarity = (
+        db.query(cards.c.rarity, func.count(product.id))
+        .join(cards, cards.c.id == product.id)
+        .filter(*conditions)
+        .filter(cards.c.rarity.isnot(None))
+        .group_by(cards.c.rarity)
+        .order_by(func.count(product.id).desc())
+        .all()
+    )
+    total, min_price, max_price = (
+        db.query(func.count(product.id), func.min(product.price), func.max(product.price))
+        .filter(*conditions)
+        .one()
+    )
+    return total, {
+        "type": [{"value": value, "count": count} for value, count in by_type],
+        "category": [{"id": cat_id, "name": name, "count": count} for cat_id, name, count in by_category],
+        "rarity": [{"value": value, "count": count} for value, count in by_rarity],
+        "min_price": min_price,
+        "max_price": max_price,
+    }
+
+def search_products(db: Session, skip: int = 0, limit: int = 20, **filters):
+    """Search products by name and attributes; returns total, a page of items and facet counts.
+
+    See _product_search_conditions for the supported filters.
+    """
+    conditions = _product_search_conditions(db, **filters)
+    query = _product_list_query(db).filter(*conditions)
+    q = filters.get("q")
+    if q and db.get_bind().dialect.name == "postgresql":
+        rank = func.ts_rank(func.to_tsvector("simple", models.Product.name), func.plainto_tsquery("simple", q))
+        query = query.order_by(rank.desc(), models.Product.id)
+    else:
+        query = query.order_by(models.Product.id)
+    items = query.offset(skip).limit(limit).all()
+    total, facets = _product_search_facets(db, conditions)
+    return {"total": total, "items": items, "facets": facets}
+
 def update_product(db: Session, product_id: int, product: schemas.ProductBase):
     db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if db_product:
@@ -183,6 +356,50 @@ def create_manual(db: Session, product: schemas.ManualCreate):
     db.refresh(db_obj)
     return db_obj
 
+SUBTYPE_BY_TYPE = {m.__mapper__.polymorphic_identity: m for m in PRODUCT_SUBTYPES}
+# Plain products (type "base") have no subtype row but are imported/exported too
+PRODUCT_MODEL_BY_TYPE = {models.Product.__mapper__.polymorphic_identity: models.Product, **SUBTYPE_BY_TYPE}
+
+def bulk_upsert_products(db: Session, items):
+    """Write a chunk of validated subtype payloads with multi-row INSERT/UPDATE statements.
+
+    ``items`` are (product_id or None, ProductCreate | Product3DCreate | CardCreate
+    | ManualCreate) pairs. An id naming an existing product of the same type updates it; other
+    rows are inserted (keeping a given id). Returns (inserted, updated, errors)
+    where errors are (index in items, message).
+    """
+    ids = [pid for pid, _ in items if pid is not None]
+    existing = dict(db.query(models.Product.id, models.Product.type).filter(models.Product.id.in_(ids)).all()) if ids else {}
+    inserts, updates, errors = {}, {}, []
+    explicit_ids = False
+    for index, (pid, product) in enumerate(items):
+        values = product.dict(by_alias=False)
+        if product.discount is None:
+            values["discounted_price"] = None
+        elif product.discounted_price is None:
+            values["discounted_price"] = _compute_discounted_price(Decimal(str(product.price)), Decimal(str(product.discount)))
+        if pid is not None and pid in existing:
+            if existing[pid] != product.type:
+                errors.append((index, f"product {pid} is a {existing[pid]!r} product, not {product.type!r}"))
+                continue
+            updates.setdefault(product.type, []).append({"id": pid, **values})
+        else:
+            if pid is not None:
+                values["id"] = pid
+                explicit_ids = True
+            inserts.setdefault(product.type, []).append(values)
+    for kind, rows in inserts.items():
+        db.execute(insert(PRODUCT_MODEL_BY_TYPE[kind]), rows)
+    for kind, rows in updates.items():
+        db.execute(update(PRODUCT_MODEL_BY_TYPE[kind]), rows)
+    if explicit_ids and db.get_bind().dialect.name == "postgresql":
+        # Keep the id sequence ahead of ids inserted explicitly
+        db.execute(text("SELECT setval(pg_get_serial_sequence('products', 'id'), (SELECT max(id) FROM products))"))
+    db.commit()
+    return sum(map(len, inserts.values())), sum(map(len, updates.values())), errors
+
+MEDIA_VARIANT_COLUMNS = {"br": models.ProductMedia.data_br, "gzip": models.ProductMedia.data_gzip}
+
 def create_product_media(db: Session, media: schemas.ProductMediaCreate):
     db_media = models.ProductMedia(**media.dict())
     db.add(db_media)
@@ -193,8 +410,50 @@ def create_product_media(db: Session, media: schemas.ProductMediaCreate):
 def get_media_for_product(db: Session, product_id: int):
     return db.query(models.ProductMedia).filter(models.ProductMedia.product_id == product_id).all()
 
-def get_product_media_by_id(db: Session, media_id: int):
-    return db.query(models.ProductMedia).filter(models.ProductMedia.id == media_id).first()
+def get_product_media_by_id(db: Session, media_id: int, with_data: bool = False):
+    query = db.query(models.ProductMedia)
+    if with_data:
+        query = query.options(undefer(models.ProductMedia.data))
+    return query.filter(models.ProductMedia.id == media_id).first()
+
+def get_product_media_file(db: Session, media_id: int, encodings=()):
+    """(filename, content_type, encoding, body) of a media file.
+
+    ``body`` is the first stored variant among ``encodings`` ("br", "gzip"),
+    else the original bytes ("identity"); only that one blob is read.
+    """
+    media = models.ProductMedia
+    variants = [(e, MEDIA_VARIANT_COLUMNS[e]) for e in encodings if e in MEDIA_VARIANT_COLUMNS]
+    if variants:
+        encoding = case(*[(column.isnot(None), e) for e, column in variants], else_="identity")
+        body = func.coalesce(*[column for _, column in variants], media.data)
+    else:
+        encoding, body = literal("identity"), media.data
+    return (
+        db.query(media.filename, media.content_type, encoding.label("encoding"), body.label("body"))
+        .filter(media.id == media_id)
+        .first()
+    )
+
+def claim_uncompressed_media(db: Session):
+    """Lock the next media file the compression worker has not seen (None if there is none)."""
+    media = (
+        db.query(models.ProductMedia)
+        .filter(models.ProductMedia.compressed_at.is_(None))
+        .order_by(models.ProductMedia.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if media is None:
+        db.rollback()
+    return media
+
+def set_media_variants(db: Session, media: models.ProductMedia, variants: dict):
+    for encoding, column in MEDIA_VARIANT_COLUMNS.items():
+        setattr(media, column.key, variants.get(encoding))
+    media.compressed_at = datetime.utcnow()
+    db.commit()
 
 def delete_product_media(db: Session, media_id: int):
     db_media = db.query(models.ProductMedia).filter(models.ProductMedia.id == media_id).first()
@@ -221,16 +480,70 @@ def get_categories(db: Session, skip: int = 0, limit: int = 10):
         .all()
     )
 
+def get_category(db: Session, category_id: int):
+    return db.query(models.Category).filter(models.Category.id == category_id).first()
+
+def get_category_index(db: Session):
+    """All categories with their visible product counts, computed in SQL."""
+    categories = models.product_categories.c
+    return (
+        db.query(
+            models.Category.id,
+            models.Category.name,
+            func.count(models.Product.id).label("product_count"),
+        )
+        .outerjoin(models.product_categories, categories.category_id == models.Category.id)
+        .outerjoin(
+            models.Product,
+            (models.Product.id == categories.product_id) & (models.Product.is_visible == True),
+        )
+        .group_by(models.Category.id, models.Category.name)
+        .order_by(models.Category.name)
+        .all()
+    )
+
+def get_category_products(db: Session, category_id: int, skip: int = 0, limit: int = 10):
+    categories = models.product_categories.c
+    return (
+        _product_list_query(db)
+        .join(models.product_categories, categories.product_id == models.Product.id)
+        .filter(categories.category_id == category_id)
+        .filter(models.Product.is_visible == True)
+        .order_by(models.Product.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
 # Order CRUD
 def create_order(db: Session, order: schemas.OrderBase):
+    """Create an order; returns None if its paypal_order_id already belongs to another order."""
     db_order = models.Order(**order.dict())
     db.add(db_order)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
     db.refresh(db_order)
     return db_order
 
-def get_orders(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.Order).offset(skip).limit(limit).all()
+def get_orders(db: Session, skip: int = 0, limit: int = 10, status: Optional[str] = None):
+    query = db.query(models.Order)
+    if status is not None:
+        query = query.filter(models.Order.status == status)
+    # Newest first; id breaks ties so pages neither overlap nor skip orders
+    return query.order_by(models.Order.date.desc(), models.Order.id.desc()).offset(skip).limit(limit).all()
+
+def get_user_orders(db: Session, user_id: int, skip: int = 0, limit: int = 10):
+    return (
+        db.query(models.Order)
+        .filter(models.Order.user_id == user_id)
+        .order_by(models.Order.date.desc(), models.Order.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 def get_order(db: Session, order_id: int):
     return db.query(models.Order).filter(models.Order.id == order_id).first()
@@ -254,17 +567,215 @@ def set_paypal_order_id(db: Session, order_id: int, paypal_order_id: str):
 def get_order_by_paypal_id(db: Session, paypal_order_id: str):
     return db.query(models.Order).filter(models.Order.paypal_order_id == paypal_order_id).first()
 
+# Webhook event queue
+def enqueue_webhook_event(db: Session, event_id: str, event_type: Optional[str], headers: str, body: str, transmission_sig: str):
+    """Store a raw webhook delivery; returns None if this delivery (event id and signature) is already queued."""
+    db_event = models.WebhookEvent(
+        event_id=event_id,
+        transmission_sig=transmission_sig,
+        event_type=event_type,
+        headers=headers,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(db_event)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return db_event
+
+def claim_webhook_events(db: Session, limit: int, lease_seconds: float):
+    """Claim due events for processing and return (id, attempts, headers, body) tuples.
+
+    Claimed rows stay in 'processing' with next_attempt_at pushed out by the
+    lease, so events held by a crashed worker are picked up again later.
+    """
+    now = datetime.utcnow()
+    events = (
+        db.query(models.WebhookEvent)
+        .filter(models.WebhookEvent.status.in_(("pending", "processing")))
+        .filter(models.WebhookEvent.next_attempt_at <= now)
+        .order_by(models.WebhookEvent.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    claimed = []
+    for event in events:
+        event.status = "processing"
+        event.attempts = (event.attempts or 0) + 1
+        event.next_attempt_at = now + timedelta(seconds=lease_seconds)
+        claimed.append((event.id, event.attempts, event.headers, event.body))
+    db.commit()
+    return claimed
+
+def webhook_event_processed(db: Session, event_id: str) -> bool:
+    """Whether a verified delivery of ``event_id`` has already been applied."""
+    event = models.WebhookEvent
+    return db.query(event.id).filter(event.event_id == event_id, event.status == "done").first() is not None
+
+def finish_webhook_event(db: Session, event_pk: int, status: str, error: Optional[str] = None, retry_at: Optional[datetime] = None):
+    values = {"status": status, "last_error": error}
+    if retry_at is not None:
+        values["next_attempt_at"] = retry_at
+    if status in ("done", "duplicate", "invalid", "failed"):
+        values["processed_at"] = datetime.utcnow()
+    db.query(models.WebhookEvent).filter(models.WebhookEvent.id == event_pk).update(values, synchronize_session=False)
+    db.commit()
+
+def _dialect_insert(db: Session):
+    """INSERT construct of the bound dialect, for ON CONFLICT upserts (Postgres/SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
 # Cart CRUD
+def _upsert_cart_item(db: Session, user_id: int, product_id: int, quantity: int) -> int:
+    # Adding a product already in the cart bumps its quantity instead of adding a row
+    cart = models.Cart.__table__
+    insert = _dialect_insert(db)
+    stmt = insert(cart).values(user_id=user_id, product_id=product_id, quantity=quantity, added_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[cart.c.user_id, cart.c.product_id],
+        set_={"quantity": cart.c.quantity + stmt.excluded.quantity},
+    ).returning(cart.c.id)
+    return db.execute(stmt).scalar_one()
+
 def add_to_cart(db: Session, cart: schemas.CartBase):
-    db_cart = models.Cart(**cart.dict())
-    db.add(db_cart)
+    cart_id = _upsert_cart_item(db, cart.user_id, cart.product_id, cart.quantity)
     db.commit()
-    db.refresh(db_cart)
-    return db_cart
+    return db.get(models.Cart, cart_id)
 
 def get_cart_items(db: Session, user_id: int):
     return db.query(models.Cart).filter(models.Cart.user_id == user_id).all()
 
+def _cart_rows_query(db: Session, user_id: int):
+    unit_price = func.coalesce(models.Product.discounted_price, models.Product.price)
+    return (
+        db.query(
+            models.Cart.id.label("cart_id"),
+            models.Cart.product_id,
+            models.Cart.quantity,
+            models.Product.name,
+            models.Product.price,
+            models.Product.discount,
+            models.Product.discounted_price,
+            models.Product.is_visible,
+            models.Product.quantity.label("stock"),
+            unit_price.label("unit_price"),
+            (unit_price * models.Cart.quantity).label("line_total"),
+        )
+        .join(models.Product, models.Product.id == models.Cart.product_id)
+        .filter(models.Cart.user_id == user_id)
+        .order_by(models.Cart.added_at, models.Cart.id)
+    )
+
+def _summarize_cart(rows):
+    cents = Decimal("0.01")
+    items = []
+    subtotal = Decimal("0")
+    total = Decimal("0")
+    for row in rows:
+        price = Decimal(str(row.price))
+        line_total = Decimal(str(row.line_total)).quantize(cents, rounding=ROUND_HALF_UP)
+        subtotal += price * row.quantity
+        total += line_total
+        items.append({
+            "cart_id": row.cart_id,
+            "product_id": row.product_id,
+            "name": row.name,
+            "quantity": row.quantity,
+            "price": row.price,
+            "discount": row.discount,
+            "discounted_price": row.discounted_price,
+            "unit_price": row.unit_price,
+            "line_total": line_total,
+            "available": bool(row.is_visible) and row.stock >= row.quantity,
+        })
+    subtotal = subtotal.quantize(cents, rounding=ROUND_HALF_UP)
+    return {
+        "items": items,
+        "item_count": sum(item["quantity"] for item in items),
+        "subtotal": subtotal,
+        "discount_total": subtotal - total,
+        "total": total,
+    }
+
+def get_cart_summary(db: Session, user_id: int):
+    """Cart rows joined with current product pricing, in a single query."""
+    return _summarize_cart(_cart_rows_query(db, user_id).all())
+
+def apply_cart_operations(db: Session, user_id: int, operations):
+    """Apply add/update/remove operations (keyed by product) in one transaction.
+
+    Raises ValueError and leaves the cart untouched if any operation is invalid.
+    """
+    cart = models.Cart.__table__
+    try:
+        for op in operations:
+            op_name = (op.op or "").lower()
+            if op_name == "add":
+                if op.quantity is None or op.quantity <= 0:
+                    raise ValueError(f"add of product {op.product_id} needs a positive quantity")
+                _upsert_cart_item(db, user_id, op.product_id, op.quantity)
+            elif op_name == "update":
+                if op.quantity is None or op.quantity < 0:
+                    raise ValueError(f"update of product {op.product_id} needs a quantity")
+                if op.quantity == 0:
+                    db.execute(cart.delete().where(cart.c.user_id == user_id, cart.c.product_id == op.product_id))
+                    continue
+                updated = db.execute(
+                    cart.update()
+                    .where(cart.c.user_id == user_id, cart.c.product_id == op.product_id)
+                    .values(quantity=op.quantity)
+                ).rowcount
+                if not updated:
+                    _upsert_cart_item(db, user_id, op.product_id, op.quantity)
+            elif op_name == "remove":
+                db.execute(cart.delete().where(cart.c.user_id == user_id, cart.c.product_id == op.product_id))
+            else:
+                raise ValueError(f"Unknown cart operation: {op.op!r}")
+    except IntegrityError:
+        db.rollback()
+        raise ValueError("Unknown product in cart operations")
+    except ValueError:
+        db.rollback()
+        raise
+    db.commit()
+    return get_cart_summary(db, user_id)
+
+def checkout_cart(db: Session, user_id: int):
+    """Turn the user's cart into an Order with OrderProduct rows, atomically.
+
+    Raises ValueError if the cart is empty or an item is hidden or out of stock.
+    """
+    rows = _cart_rows_query(db, user_id).with_for_update(of=models.Cart).all()
+    if not rows:
+        db.rollback()
+        raise ValueError("Cart is empty")
+    summary = _summarize_cart(rows)
+    unavailable = [item["name"] for item in summary["items"] if not item["available"]]
+    if unavailable:
+        db.rollback()
+        raise ValueError(f"Unavailable items in cart: {', '.join(unavailable)}")
+
+    db_order = models.Order(user_id=user_id, total_cost=summary["total"], status="CREATED")
+    db.add(db_order)
+    db.flush()
+    for item in summary["items"]:
+        db.add(models.OrderProduct(order_id=db_order.id, product_id=item["product_id"], quantity=item["quantity"], unit_price=item["unit_price"]))
+    _record_sales(db, {item["product_id"]: item["quantity"] for item in summary["items"]})
+    db.query(models.Cart).filter(models.Cart.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+    db.refresh(db_order)
+    return db_order
+
 def update_cart_item(db: Session, cart_id: int, quantity: int):
     cart_item = db.query(models.Cart).filter(models.Cart.id == cart_id).first()
     if cart_item:
@@ -283,51 +794,710 @@ def delete_cart_item(db: Session, cart_id: int):
 
 # --- View tracking and highlighting ---
 
-def increment_product_view(db: Session, product_id: int):
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not db_product:
-        return None
-    db_product.view_count = (db_product.view_count or 0) + 1
-    db_product.last_viewed_at = datetime.utcnow()
+def lock_job_cursor(db: Session, name: str):
+    """Lock (creating if needed) the job_cursors row ``name`` for this transaction.
+
+    Returns None, with the transaction rolled back, when another worker holds it.
+    """
+    insert_ = _dialect_insert(db)
+    db.execute(insert_(models.JobCursor).values(name=name, position=0).on_conflict_do_nothing(index_elements=["name"]))
+    cursor = (
+        db.query(models.JobCursor)
+        .filter(models.JobCursor.name == name)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if cursor is None:
+        db.rollback()
+    return cursor
+
+def _settled_prefix(rows, cutoff: datetime, timestamp):
+    """The leading ``rows`` (in id order) up to the first one newer than ``cutoff``.
+
+    A job cursor moves to the last id processed, so a row still inside the
+    grace period has to end the batch; filtering it out would let the cursor
+    pass it for good.
+    """
+    for index, row in enumerate(rows):
+        if timestamp(row) > cutoff:
+            return rows[:index]
+    return rows
+
+PRODUCT_EVENTS_CURSOR = "product_events_rollup"
+_EVENT_COLUMNS = {"view": 0, "sale": 1}
+
+def insert_product_events(db: Session, rows):
+    """Bulk-append product events (dicts with product_id, kind, quantity, occurred_at)."""
+    if rows:
+        db.execute(insert(models.ProductEvent), rows)
+        db.commit()
+
+def _upsert_product_stats(db: Session, insert_, model, key: str, counts: dict):
+    table = model.__table__
+    stmt = insert_(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", key],
+        set_={"views": table.c.views + stmt.excluded.views, "sales": table.c.sales + stmt.excluded.sales},
+    )
+    db.execute(stmt, [{"product_id": pid, key: k, "views": v, "sales": s} for (pid, k), (v, s) in counts.items()])
+
+def _apply_product_counter_deltas(db: Session, totals: dict):
+    """Add rolled-up views/sales to the denormalized counters on products in one UPDATE."""
+    product = models.Product
+    views = {pid: t[0] for pid, t in totals.items() if t[0]}
+    sales = {pid: t[1] for pid, t in totals.items() if t[1]}
+    last_viewed = {pid: t[2] for pid, t in totals.items() if t[2] is not None}
+    values = {}
+    if views:
+        values[product.view_count] = func.coalesce(product.view_count, 0) + case(views, value=product.id, else_=0)
+    if sales:
+        values[product.sold_count] = func.coalesce(product.sold_count, 0) + case(sales, value=product.id, else_=0)
+    if last_viewed:
+        values[product.last_viewed_at] = case(last_viewed, value=product.id, else_=product.last_viewed_at)
+    if values:
+        db.query(product).filter(product.id.in_(list(totals))).update(values, synchronize_session=False)
+
+def roll_up_product_events(db: Session, batch_size: int = 5000, grace_seconds: float = 30):
+    """Fold the next batch of product events into the hourly/daily stats; returns events processed.
+
+    Progress is kept in job_cursors as the last event id. Events younger than
+    ``grace_seconds`` are left for the next pass so rows from transactions
+    that commit slightly out of id order are not skipped. The cursor row is
+    locked for the pass, so concurrent workers never count an event twice.
+    """
+    insert_ = _dialect_insert(db)
+    cursor = lock_job_cursor(db, PRODUCT_EVENTS_CURSOR)
+    if cursor is None:  # another worker is rolling up
+        return 0
+    now = datetime.utcnow()
+    event = models.ProductEvent
+    events = (
+        db.query(event.id, event.product_id, event.kind, event.quantity, event.occurred_at)
+        .filter(event.id > cursor.position)
+        .order_by(event.id)
+        .limit(batch_size)
+        .all()
+    )
+    events = _settled_prefix(events, now - timedelta(seconds=grace_seconds), lambda e: e.occurred_at)
+    if not events:
+        db.rollback()
+        return 0
+
+    hourly, daily, totals = {}, {}, {}
+    for e in events:
+        column = _EVENT_COLUMNS.get(e.kind)
+        if column is None:
+            continue
+        hour = e.occurred_at.replace(minute=0, second=0, microsecond=0)
+        hourly.setdefault((e.product_id, hour), [0, 0])[column] += e.quantity
+        daily.setdefault((e.product_id, hour.date()), [0, 0])[column] += e.quantity
+        total = totals.setdefault(e.product_id, [0, 0, None])
+        total[column] += e.quantity
+        if column == 0 and (total[2] is None or e.occurred_at > total[2]):
+            total[2] = e.occurred_at
+    if totals:
+        _upsert_product_stats(db, insert_, models.ProductStatsHourly, "bucket", hourly)
+        _upsert_product_stats(db, insert_, models.ProductStatsDaily, "day", daily)
+        _apply_product_counter_deltas(db, totals)
+    cursor.position = events[-1].id
+    cursor.updated_at = now
     db.commit()
-    db.refresh(db_product)
-    return db_product
+    return len(events)
+
+def prune_product_events(db: Session, event_retention_days: int = 30, hourly_retention_days: int = 14):
+    """Delete rolled-up events and hourly buckets past their retention; daily stats are kept."""
+    now = datetime.utcnow()
+    position = db.query(models.JobCursor.position).filter(models.JobCursor.name == PRODUCT_EVENTS_CURSOR).scalar() or 0
+    events = (
+        db.query(models.ProductEvent)
+        .filter(models.ProductEvent.id <= position)
+        .filter(models.ProductEvent.occurred_at < now - timedelta(days=event_retention_days))
+        .delete(synchronize_session=False)
+    )
+    buckets = (
+        db.query(models.ProductStatsHourly)
+        .filter(models.ProductStatsHourly.bucket < now - timedelta(days=hourly_retention_days))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return events, buckets
+
+def get_trending_products(db: Session, metric: str = "views", days: int = 7, hours: Optional[int] = None, limit: int = 10):
+    """Visible products with the most views or sales in the window, from the rollup tables.
+
+    ``hours`` selects a window on the hourly buckets, otherwise the last
+    ``days`` calendar days (today included) of daily stats are summed.
+    """
+    if metric not in ("views", "sales"):
+        raise ValueError("metric must be 'views' or 'sales'")
+    now = datetime.utcnow()
+    if hours is not None:
+        stats = models.ProductStatsHourly
+        since = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=max(1, hours) - 1)
+        in_window = stats.bucket >= since
+    else:
+        stats = models.ProductStatsDaily
+        in_window = stats.day >= now.date() - timedelta(days=max(1, days) - 1)
+    total = func.sum(getattr(stats, metric))
+    rows = (
+        db.query(stats.product_id)
+        .join(models.Product, models.Product.id == stats.product_id)
+        .filter(models.Product.is_visible == True, in_window)
+        .group_by(stats.product_id)
+        .having(total > 0)
+        .order_by(total.desc(), stats.product_id)
+        .limit(limit)
+        .all()
+    )
+    return get_products_by_ids(db, [pid for (pid,) in rows])
 
 
-def get_highlighted_products(db: Session, limit: int = 10):
-    # Fetch visible, in-stock products
+def highlight_score(p, now: datetime) -> float:
+    """Landing-page ranking of a product row (recent view/sold counts, price, discount, created_at)."""
+    views = int(p.view_count or 0)
+    sold = int(p.sold_count or 0)
+    price = Decimal(str(p.price)) if p.price is not None else Decimal("0")
+    discount_amt = Decimal(str(p.discount)) if p.discount is not None else Decimal("0")
+    discount_ratio = float((discount_amt / price).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)) if price > 0 else 0.0
+    discount_ratio = max(0.0, min(discount_ratio, 0.8))
+    # Log-scaled signals
+    v = math.log1p(views)
+    s = math.log1p(sold)
+    # Interest gap: high views but low sales
+    gap = v * (1.0 - min(s / v if v > 0 else 0.0, 1.0))
+    # Recency boost based on age
+    days = 0.0
+    if p.created_at:
+        age = (now - p.created_at).days
+        days = float(age)
+    recency = math.exp(-(days / 45.0))
+    # Weighted sum
+    return 0.6 * s + 0.4 * v + 0.35 * gap + 0.3 * discount_ratio + 0.4 * recency
+
+
+def get_highlighted_products(db: Session, limit: int = 10, window_days: int = 7):
+    # Score visible, in-stock products on the base columns plus their views
+    # and sales over the last ``window_days`` (daily rollups); full products
+    # (subtypes, media) are loaded just for the winners.
+    stats = models.ProductStatsDaily
+    recent = (
+        select(stats.product_id, func.sum(stats.views).label("views"), func.sum(stats.sales).label("sales"))
+        .where(stats.day >= datetime.utcnow().date() - timedelta(days=max(1, window_days) - 1))
+        .group_by(stats.product_id)
+        .subquery()
+    )
     candidates = (
-        db.query(models.Product)
-        .options(selectinload(models.Product.categories))
+        db.query(
+            models.Product.id,
+            func.coalesce(recent.c.views, 0).label("view_count"),
+            func.coalesce(recent.c.sales, 0).label("sold_count"),
+            models.Product.price,
+            models.Product.discount,
+            models.Product.created_at,
+        )
+        .outerjoin(recent, recent.c.product_id == models.Product.id)
         .filter(models.Product.is_visible == True)
         .filter(models.Product.quantity > 0)
         .all()
     )
 
-    def score(p: models.Product) -> float:
-        import math
-        views = int(p.view_count or 0)
-        sold = int(p.sold_count or 0)
-        price = Decimal(str(p.price)) if p.price is not None else Decimal("0")
-        discount_amt = Decimal(str(p.discount)) if p.discount is not None else Decimal("0")
-        discount_ratio = float((discount_amt / price).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)) if price > 0 else 0.0
-        discount_ratio = max(0.0, min(discount_ratio, 0.8))
-        # Log-scaled signals
-        v = math.log1p(views)
-        s = math.log1p(sold)
-        # Interest gap: high views but low sales
-        gap = v * (1.0 - min(s / v if v > 0 else 0.0, 1.0))
-        # Recency boost based on age
-        days = 0.0
-        if p.created_at:
-            age = (datetime.utcnow() - p.created_at).days
-            days = float(age)
-        recency = math.exp(-(days / 45.0))
-        # Weighted sum
-        return 0.6 * s + 0.4 * v + 0.35 * gap + 0.3 * discount_ratio + 0.4 * recency
-
-    ranked = sorted(candidates, key=score, reverse=True)
-    return ranked[: max(0, int(limit))]
+    now = datetime.utcnow()
+    top = heapq.nlargest(max(0, int(limit)), candidates, key=lambda p: highlight_score(p, now))
+    return get_products_by_ids(db, [p.id for p in top])
+
+
+# --- Related products (frequently bought together) ---
+
+RELATED_PAYMENTS_CURSOR = "related_products_payments"
+
+def get_related_products(db: Session, product_id: int, limit: int = 10):
+    related = models.RelatedProduct
+    ids = [
+        rid for (rid,) in db.query(related.related_id)
+        .join(models.Product, models.Product.id == related.related_id)
+        .filter(related.product_id == product_id, models.Product.is_visible == True)
+        .order_by(related.rank)
+        .limit(limit)
+    ]
+    return get_products_by_ids(db, ids)
+
+def order_pair_counts(orders, max_items: int = 50) -> dict:
+    """{(product_id, related_id): orders containing both} for iterables of product ids per order.
+
+    Orders with more than ``max_items`` distinct products (bulk or test orders)
+    are skipped; they would add quadratically many weak pairs.
+    """
+    counts = {}
+    for product_ids in orders:
+        ids = sorted(set(product_ids))
+        if not 2 <= len(ids) <= max_items:
+            continue
+        for a in ids:
+            for b in ids:
+                if a != b:
+                    counts[(a, b)] = counts.get((a, b), 0) + 1
+    return counts
+
+def add_product_pair_counts(db: Session, counts: dict):
+    """Add ``counts`` (see order_pair_counts) to product_pairs with one upsert."""
+    if not counts:
+        return
+    table = models.ProductPair.__table__
+    stmt = _dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "related_id"],
+        set_={"count": table.c.count + stmt.excluded.count},
+    )
+    # Sorted so concurrent writers lock rows in the same order
+    db.execute(stmt, [{"product_id": a, "related_id": b, "count": n} for (a, b), n in sorted(counts.items())])
+
+def refresh_related_products(db: Session, product_ids=None, top_n: int = 20):
+    """Rebuild the top-N rows of product_related from product_pairs (all products if ids is None)."""
+    related = models.RelatedProduct.__table__
+    pairs = models.ProductPair.__table__
+    ids = None if product_ids is None else sorted(product_ids)
+    chunks = [None] if ids is None else [ids[i:i + 1000] for i in range(0, len(ids), 1000)]
+    for chunk in chunks:
+        rank = func.row_number().over(
+            partition_by=pairs.c.product_id,
+            order_by=(pairs.c.count.desc(), pairs.c.related_id),
+        ).label("rank")
+        ranked = select(pairs.c.product_id, pairs.c.related_id, pairs.c.count, rank)
+        delete = related.delete()
+        if chunk is not None:
+            ranked = ranked.where(pairs.c.product_id.in_(chunk))
+            delete = delete.where(related.c.product_id.in_(chunk))
+        ranked = ranked.subquery()
+        db.execute(delete)
+        db.execute(
+            related.insert().from_select(
+                ["product_id", "related_id", "score", "rank"],
+                select(ranked.c.product_id, ranked.c.related_id, ranked.c.count, ranked.c.rank).where(ranked.c.rank <= top_n),
+            )
+        )
+
+def update_related_products(db: Session, batch_size: int = 1000, grace_seconds: float = 30, top_n: int = 20, max_items: int = 50):
+    """Count product pairs of the next batch of paid orders and refresh the affected top-N lists.
+
+    Returns the number of payments processed. Only paid (COMPLETED) orders
+    count, like in roll_up_sales: the cursor is the last order_payments id
+    processed, and payments younger than ``grace_seconds`` wait for the next
+    pass.
+    """
+    cursor = lock_job_cursor(db, RELATED_PAYMENTS_CURSOR)
+    if cursor is None:
+        return 0
+    now = datetime.utcnow()
+    payment = models.OrderPayment
+    payments = (
+        db.query(payment.id, payment.order_id, payment.paid_at)
+        .filter(payment.id > cursor.position)
+        .order_by(payment.id)
+        .limit(batch_size)
+        .all()
+    )
+    payments = _settled_prefix(payments, now - timedelta(seconds=grace_seconds), lambda p: p.paid_at)
+    if not payments:
+        db.rollback()
+        return 0
+    order_ids = {p.order_id for p in payments}
+    by_order = {}
+    lines = db.query(models.OrderProduct.order_id, models.OrderProduct.product_id).filter(models.OrderProduct.order_id.in_(order_ids))
+    for order_id, product_id in lines:
+        by_order.setdefault(order_id, []).append(product_id)
+    counts = order_pair_counts(by_order.values(), max_items)
+    add_product_pair_counts(db, counts)
+    refresh_related_products(db, {a for a, _ in counts}, top_n)
+    cursor.position = payments[-1].id
+    cursor.updated_at = now
+    db.commit()
+    return len(payments)
+
+
+# --- Sales reporting ---
+
+SALES_ROLLUP_CURSOR = "sales_rollup"
+
+def _add_to_rollup(db: Session, model, keys, rows):
+    """Upsert ``rows`` into an additive rollup table, adding to its non-key columns."""
+    if not rows:
+        return
+    table = model.__table__
+    stmt = _dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={c.name: c + stmt.excluded[c.name] for c in table.columns if c.name not in keys},
+    )
+    db.execute(stmt, rows)
+
+def record_order_payment(db: Session, order_id: int):
+    """Log an order as paid in the caller's transaction; roll_up_sales counts it from there."""
+    db.execute(insert(models.OrderPayment).values(order_id=order_id, paid_at=datetime.utcnow()))
+
+def roll_up_sales(db: Session, batch_size: int = 1000, grace_seconds: float = 30):
+    """Add the next batch of order payments to sales_daily / product_sales_daily; returns payments processed.
+
+    Only paid (COMPLETED) orders count, on the day they were paid: orders
+    that are never paid, or whose stock hold was refused, are not revenue.
+    Line revenue is quantity x the unit price recorded on the order line, or
+    the product's current price for lines recorded before unit prices were
+    kept. The cursor is the last order_payments id processed, with the grace
+    period of roll_up_product_events.
+    """
+    cursor = lock_job_cursor(db, SALES_ROLLUP_CURSOR)
+    if cursor is None:
+        return 0
+    now = datetime.utcnow()
+    payment = models.OrderPayment
+    payments = (
+        db.query(payment.id, payment.paid_at, models.Order.total_cost)
+        .join(models.Order, models.Order.id == payment.order_id)
+        .filter(payment.id > cursor.position)
+        .order_by(payment.id)
+        .limit(batch_size)
+        .all()
+    )
+    payments = _settled_prefix(payments, now - timedelta(seconds=grace_seconds), lambda p: p.paid_at)
+    if not payments:
+        db.rollback()
+        return 0
+    days = {}
+    payment_days = {}
+    for p in payments:
+        day = p.paid_at.date()
+        payment_days[p.id] = day
+        totals = days.setdefault(day, [0, 0, Decimal("0")])
+        totals[0] += 1
+        totals[2] += Decimal(str(p.total_cost))
+
+    line = models.OrderProduct
+    unit_price = func.coalesce(line.unit_price, models.Product.discounted_price, models.Product.price)
+    lines = (
+        db.query(payment.id, line.product_id, line.quantity, unit_price)
+        .join(line, line.order_id == payment.order_id)
+        .join(models.Product, models.Product.id == line.product_id)
+        .filter(payment.id > cursor.position, payment.id <= payments[-1].id)
+    )
+    products = {}
+    for payment_id, product_id, quantity, price in lines:
+        day = payment_days[payment_id]
+        days[day][1] += quantity
+        totals = products.setdefault((product_id, day), [0, Decimal("0")])
+        totals[0] += quantity
+        totals[1] += Decimal(str(price)) * quantity
+
+    cents = Decimal("0.01")
+    _add_to_rollup(db, models.SalesDaily, ("day",), [
+        {"day": day, "orders": n, "units": units, "revenue": revenue.quantize(cents, rounding=ROUND_HALF_UP)}
+        for day, (n, units, revenue) in sorted(days.items())
+    ])
+    _add_to_rollup(db, models.ProductSalesDaily, ("product_id", "day"), [
+        {"product_id": pid, "day": day, "units": units, "revenue": revenue.quantize(cents, rounding=ROUND_HALF_UP)}
+        for (pid, day), (units, revenue) in sorted(products.items())
+    ])
+    cursor.position = payments[-1].id
+    cursor.updated_at = now
+    db.commit()
+    return len(payments)
+
+def reset_sales_rollups(db: Session) -> bool:
+    """Empty the sales rollups and rewind their cursor so roll_up_sales recounts every payment.
+
+    Returns False, changing nothing, if a rollup pass holds the cursor.
+    """
+    cursor = lock_job_cursor(db, SALES_ROLLUP_CURSOR)
+    if cursor is None:
+        return False
+    db.query(models.SalesDaily).delete(synchronize_session=False)
+    db.query(models.ProductSalesDaily).delete(synchronize_session=False)
+    cursor.position = 0
+    cursor.updated_at = datetime.utcnow()
+    db.commit()
+    return True
+
+def get_sales_rollup_time(db: Session):
+    """When the sales rollups last advanced (None if never)."""
+    return db.query(models.JobCursor.updated_at).filter(models.JobCursor.name == SALES_ROLLUP_CURSOR).scalar()
+
+def get_daily_sales(db: Session, start, end):
+    """Per-day paid orders, units and revenue for ``start`` <= day <= ``end``, from sales_daily."""
+    sales = models.SalesDaily
+    return (
+        db.query(sales.day, sales.orders, sales.units, sales.revenue)
+        .filter(sales.day >= start, sales.day <= end)
+        .order_by(sales.day)
+        .all()
+    )
+
+def get_product_sales(db: Session, start, end, limit: int = 50, product_id: Optional[int] = None):
+    """Best-selling products by revenue between ``start`` and ``end`` (inclusive), from product_sales_daily."""
+    sales = models.ProductSalesDaily
+    units = func.sum(sales.units).label("units")
+    revenue = func.sum(sales.revenue).label("revenue")
+    query = (
+        db.query(sales.product_id, models.Product.name, units, revenue)
+        .join(models.Product, models.Product.id == sales.product_id)
+        .filter(sales.day >= start, sales.day <= end)
+    )
+    if product_id is not None:
+        query = query.filter(sales.product_id == product_id)
+    return (
+        query.group_by(sales.product_id, models.Product.name)
+        .order_by(revenue.desc(), sales.product_id)
+        .limit(limit)
+        .all()
+    )
+
+def order_export_query(status: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Orders LEFT JOIN their lines as flat rows, ordered by order id, for streaming exports."""
+    orders = models.Order.__table__
+    lines = models.OrderProduct.__table__
+    query = (
+        select(
+            orders.c.id, orders.c.date, orders.c.status, orders.c.user_id, orders.c.total_cost, orders.c.paypal_order_id,
+            lines.c.product_id, lines.c.quantity, lines.c.unit_price,
+        )
+        .outerjoin(lines, lines.c.order_id == orders.c.id)
+        .order_by(orders.c.id, lines.c.product_id)
+    )
+    if status is not None:
+        query = query.where(orders.c.status == status)
+    if start is not None:
+        query = query.where(orders.c.date >= start)
+    if end is not None:
+        query = query.where(orders.c.date < end)
+    return query
+
+
+# --- Stock reservations ---
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_id: int):
+        super().__init__(f"Not enough stock for product {product_id}")
+        self.product_id = product_id
+
+class CheckoutClosed(ValueError):
+    """The order is already paid, or its checkout window has passed."""
+
+def _lock_order(db: Session, order_id: int):
+    # Serialises checkout and payment of one order (double clicks, webhook retries).
+    # populate_existing: an order already in the session is re-read under the lock,
+    # not served with the status it had before another transaction paid it
+    return db.query(models.Order).filter(models.Order.id == order_id).with_for_update().populate_existing().first()
+
+def _order_quantities(db: Session, order_id: int) -> dict:
+    lines = db.query(models.OrderProduct.product_id, func.sum(models.OrderProduct.quantity)).filter(
+        models.OrderProduct.order_id == order_id
+    ).group_by(models.OrderProduct.product_id)
+    return dict(lines.all())
+
+def _adjust_stock(db: Session, quantities: dict, sign: int):
+    # One UPDATE per product in id order, so concurrent transactions lock rows in the same order
+    products = models.Product.__table__
+    for product_id in sorted(quantities):
+        db.execute(
+            update(products).where(products.c.id == product_id).values(quantity=products.c.quantity + sign * quantities[product_id])
+        )
+
+def _active_reservations(db: Session, order_id: int):
+    return (
+        db.query(models.StockReservation)
+        .filter(models.StockReservation.order_id == order_id, models.StockReservation.status == "active")
+        .order_by(models.StockReservation.product_id)
+        .with_for_update()
+        .all()
+    )
+
+def reserve_order_stock(db: Session, order_id: int, ttl_seconds: float) -> datetime:
+    """Hold stock for the lines of an order; returns when the hold expires.
+
+    Each product's stock is taken with a conditional UPDATE (quantity >=
+    wanted), so the hot row is locked only for this short transaction rather
+    than across the PayPal round trip. The order row is locked first, so
+    concurrent calls for one order take its stock once. Calling again while a
+    hold is active extends it, but an order's holds never last past
+    ``ttl_seconds`` after its first hold; after that (or once the order is
+    paid) CheckoutClosed is raised. Raises InsufficientStock, with nothing
+    held, if any product runs short.
+    """
+    order = _lock_order(db, order_id)
+    if order is None or order.status == "COMPLETED":
+        db.rollback()
+        raise CheckoutClosed("Order is already paid" if order is not None else "Order not found")
+    now = datetime.utcnow()
+    first_hold = (
+        db.query(func.min(models.StockReservation.created_at))
+        .filter(models.StockReservation.order_id == order_id)
+        .scalar()
+    )
+    expires_at = (first_hold or now) + timedelta(seconds=ttl_seconds)
+    if expires_at <= now:
+        db.rollback()
+        raise CheckoutClosed("Checkout window for this order has passed; place a new order")
+    active = _active_reservations(db, order_id)
+    if active:
+        for reservation in active:
+            reservation.expires_at = expires_at
+        db.commit()
+        return expires_at
+
+    products = models.Product.__table__
+    quantities = _order_quantities(db, order_id)
+    for product_id in sorted(quantities):
+        wanted = quantities[product_id]
+        taken = db.execute(
+            update(products)
+            .where(products.c.id == product_id, products.c.quantity >= wanted)
+            .values(quantity=products.c.quantity - wanted)
+        ).rowcount
+        if not taken:
+            db.rollback()
+            raise InsufficientStock(product_id)
+    if quantities:
+        db.execute(insert(models.StockReservation), [
+            {"order_id": order_id, "product_id": pid, "quantity": qty, "status": "active", "expires_at": expires_at, "created_at": now}
+            for pid, qty in sorted(quantities.items())
+        ])
+    db.commit()
+    return expires_at
+
+def _return_reserved_stock(db: Session, reservations, status: str):
+    quantities = {}
+    for reservation in reservations:
+        quantities[reservation.product_id] = quantities.get(reservation.product_id, 0) + reservation.quantity
+        reservation.status = status
+    _adjust_stock(db, quantities, +1)
+
+def release_order_stock(db: Session, order_id: int) -> int:
+    """Give back an order's active holds now (e.g. the PayPal order could not be created)."""
+    reservations = _active_reservations(db, order_id)
+    _return_reserved_stock(db, reservations, "released")
+    db.commit()
+    return len(reservations)
+
+def expire_stock_reservations(db: Session, batch_size: int = 500) -> int:
+    """Return the stock of up to ``batch_size`` expired holds; returns how many were expired.
+
+    Rows another sweeper (or a payment converting them) has locked are
+    skipped, so any number of sweepers can run side by side.
+    """
+    reservation = models.StockReservation
+    expired = (
+        db.query(reservation)
+        .filter(reservation.status == "active", reservation.expires_at <= datetime.utcnow())
+        .order_by(reservation.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not expired:
+        db.rollback()
+        return 0
+    _return_reserved_stock(db, expired, "expired")
+    db.commit()
+    return len(expired)
+
+def mark_order_paid(db: Session, order_id: int) -> Optional[int]:
+    """Record a captured payment: convert the order's holds, log the payment and mark it COMPLETED.
+
+    Runs under the order's row lock and commits once. Returns the units taken
+    from stock again (see convert_order_reservations), or None if the order
+    does not exist or was already paid.
+    """
+    order = _lock_order(db, order_id)
+    if order is None or order.status == "COMPLETED":
+        db.rollback()
+        return None
+    retaken = convert_order_reservations(db, order_id)
+    record_order_payment(db, order_id)
+    order.status = "COMPLETED"
+    db.commit()
+    return retaken
+
+def convert_order_reservations(db: Session, order_id: int) -> int:
+    """Mark an order's holds as sold, in the caller's transaction; returns units taken from stock again.
+
+    Active holds already took their stock. If the hold expired (or there never
+    was one) the payment has still gone through, so the order's quantities are
+    taken from stock unconditionally and may drive it negative.
+    """
+    active = _active_reservations(db, order_id)
+    for reservation in active:
+        reservation.status = "converted"
+    if active:
+        return 0
+    quantities = _order_quantities(db, order_id)
+    _adjust_stock(db, quantities, -1)
+    return sum(quantities.values())
+
+
+# --- Landing-page cache entries ---
+
+def get_cache_entry(db: Session, key: str):
+    entry = models.CacheEntry
+    return db.query(entry.value, entry.expires_at).filter(entry.key == key).first()
+
+def get_cache_status(db: Session):
+    """Every cache entry's timings and size, without loading the cached bodies."""
+    entry = models.CacheEntry
+    return (
+        db.query(
+            entry.key, entry.refreshed_at, entry.expires_at, entry.duration_ms,
+            func.length(entry.value).label("size_bytes"), entry.lease_until,
+        )
+        .order_by(entry.key)
+        .all()
+    )
+
+def acquire_cache_lease(db: Session, key: str, owner: str, lease_seconds: float, stale_before: Optional[datetime] = None) -> bool:
+    """Take the refresh lease of ``key`` unless another owner holds an unexpired one.
+
+    With ``stale_before``, only an entry refreshed before then (or expired)
+    is leased, so a process that lost the race does not redo the winner's
+    work. The conditional UPDATE is atomic, so of several processes racing for
+    the same entry exactly one recomputes it. The lease is committed rather
+    than held as a row lock, so no transaction stays open during the refresh.
+    """
+    insert_ = _dialect_insert(db)
+    db.execute(insert_(models.CacheEntry).values(key=key).on_conflict_do_nothing(index_elements=["key"]))
+    now = datetime.utcnow()
+    entry = models.CacheEntry
+    conditions = [entry.key == key, (entry.lease_until.is_(None)) | (entry.lease_until < now)]
+    if stale_before is not None:
+        conditions.append(entry.refreshed_at.is_(None) | (entry.refreshed_at < stale_before) | (entry.expires_at <= now))
+    taken = (
+        db.query(entry)
+        .filter(*conditions)
+        .update({entry.lease_owner: owner, entry.lease_until: now + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+    )
+    db.commit()
+    return taken == 1
+
+def store_cache_entry(db: Session, key: str, owner: str, value: Optional[bytes], refreshed_at: datetime, ttl_seconds: float, duration_ms: int) -> bool:
+    """Save a refreshed value and release the lease; False if the lease was lost meanwhile."""
+    entry = models.CacheEntry
+    values = {entry.lease_owner: None, entry.lease_until: None}
+    if value is not None:
+        values.update({
+            entry.value: value,
+            entry.refreshed_at: refreshed_at,
+            entry.expires_at: refreshed_at + timedelta(seconds=ttl_seconds),
+            entry.duration_ms: duration_ms,
+        })
+    stored = db.query(entry).filter(entry.key == key, entry.lease_owner == owner).update(values, synchronize_session=False)
+    db.commit()
+    return stored == 1
+
+def prune_cache_entries(db: Session, keep_keys, older_than: datetime) -> int:
+    """Delete entries no longer warmed that expired before ``older_than``."""
+    entry = models.CacheEntry
+    deleted = (
+        db.query(entry)
+        .filter(entry.key.notin_(list(keep_keys)), entry.expires_at < older_than)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
 
 
 # --- Pricing and visibility management ---
@@ -387,3 +1557,81 @@ def apply_product_discount(db: Session, product_id: int, mode: str, value: float
     db.commit()
     db.refresh(db_product)
     return db_product
+
+
+# Bulk field updates: one set-based UPDATE over a selection of products, with
+# discounted_price recomputed in SQL the way _compute_discounted_price does.
+def _product_selection(ids=None, category_id=None, product_type=None):
+    conditions = []
+    if ids is not None:
+        conditions.append(models.Product.id.in_(ids))
+    if category_id is not None:
+        conditions.append(models.Product.id.in_(
+            select(models.product_categories.c.product_id).where(models.product_categories.c.category_id == category_id)
+        ))
+    if product_type is not None:
+        if product_type not in SUBTYPE_BY_TYPE:
+            raise ValueError(f"product_type must be one of {', '.join(SUBTYPE_BY_TYPE)}")
+        conditions.append(models.Product.type == product_type)
+    if not conditions:
+        raise ValueError("Select products by ids, category_id and/or product_type")
+    return conditions
+
+
+def _sql_money(db: Session, expr):
+    """ROUND(expr, 2), half up for the non-negative amounts used here."""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps NUMERIC as REAL; nudge binary near-halves (5.02499..) up
+        expr = expr + 1e-9
+    return func.round(expr, 2)
+
+
+def _bulk_update(db: Session, conditions, values: dict) -> int:
+    stmt = update(models.Product).where(*conditions).values(**values).execution_options(synchronize_session=False)
+    count = db.execute(stmt).rowcount
+    db.commit()
+    return count
+
+
+def bulk_set_product_visibility(db: Session, is_visible: bool, **selection) -> int:
+    return _bulk_update(db, _product_selection(**selection), {"is_visible": bool(is_visible)})
+
+
+def bulk_update_product_price(db: Session, price: float, **selection) -> int:
+    if price < 0:
+        raise ValueError("Price cannot be negative")
+    conditions = _product_selection(**selection)
+    price = Decimal(str(price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    discount = models.Product.discount
+    return _bulk_update(db, conditions, {
+        "price": price,
+        "discounted_price": case(
+            (discount.is_(None), None),
+            (discount >= price, 0),
+            else_=_sql_money(db, price - discount),
+        ),
+    })
+
+
+def bulk_apply_product_discount(db: Session, mode: str, value: float, **selection) -> int:
+    """apply_product_discount for every selected product, computed against each row's own price."""
+    mode_l = (mode or "").lower()
+    if mode_l not in ("percent", "amount"):
+        raise ValueError("mode must be 'percent' or 'amount'")
+    if value < 0:
+        raise ValueError("Discount value cannot be negative")
+    conditions = _product_selection(**selection)
+
+    price = models.Product.price
+    if mode_l == "percent":
+        if value > 100:
+            raise ValueError("Percentage cannot exceed 100")
+        discount_amount = _sql_money(db, price * Decimal(str(value)) / 100)
+    else:
+        amount = Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        discount_amount = case((price < amount, price), else_=amount)
+    # SET expressions all see the pre-update row, so discounted_price derives from price, not discount
+    return _bulk_update(db, conditions, {
+        "discount": discount_amount,
+        "discounted_price": _sql_money(db, price - discount_amount),
+    })
@@ -1,14 +1,39 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://postgres:a@localhost/3d')
+# Optional read replica for public catalog reads; defaults to the primary
+READ_REPLICA_URL = os.getenv('READ_REPLICA_URL')
+# After an admin write, that browser reads from the primary for this long (replication lag allowance)
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+PRIMARY_PIN_COOKIE = "read_primary_until"
 
-engine = create_engine(DATABASE_URL)
+# Connection pool per engine (SQLAlchemy's defaults); also sizes ratelimit.MAX_CONCURRENT_REQUESTS
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+
+def _create_engine(url):
+    if url in ('sqlite://', 'sqlite:///:memory:'):  # single-connection pool, no sizing
+        return create_engine(url)
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+read_engine = _create_engine(READ_REPLICA_URL) if READ_REPLICA_URL else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _refuse_writes(session, flush_context, instances):
+    raise RuntimeError("Read-only session: writes must use SessionLocal (primary)")
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,219 @@
+"""Refresh-ahead cache for the landing-page reads.
+
+These are the highlighted products, the first CACHE_WARM_PAGES catalog
+pages, the category menu and the first page of each category. Their JSON
+bodies are precomputed into cache_entries and valid for CACHE_TTL_SECONDS.
+The scheduler here re-renders each entry once CACHE_REFRESH_AHEAD of its TTL
+has passed, so visitors never wait on a cold computation, including right
+after a deploy, when the first pass warms everything.
+
+Refreshes are single-flight: a process must take the entry's lease
+(crud.acquire_cache_lease) before recomputing, so with several app processes
+only one does the work. The public routes only read entries. On a miss they
+compute the page as before, and visitors pinned to the primary after an
+admin write bypass the cache. Entries are also kept in process memory until
+they expire, so a hit usually costs no query at all.
+
+The scheduler can also run as a sidecar instead of inside the app::
+
+    CACHE_WARMING_ENABLED=0 uvicorn app.main:app ...
+    python -m app.cli warm-cache --loop
+
+Last refresh time and duration per entry are listed on /admin/cache.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.responses import Response
+
+from . import crud, serialization
+from .background import PeriodicWorker
+from .database import ReadSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CACHE_WARMING_ENABLED = os.getenv("CACHE_WARMING_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_REFRESH_AHEAD = float(os.getenv("CACHE_REFRESH_AHEAD", "0.75"))  # fraction of the TTL
+CACHE_CHECK_SECONDS = float(os.getenv("CACHE_CHECK_SECONDS", "5"))
+CACHE_LEASE_SECONDS = float(os.getenv("CACHE_LEASE_SECONDS", "30"))
+CACHE_WARM_PAGES = int(os.getenv("CACHE_WARM_PAGES", "3"))
+CACHE_WARM_CATEGORIES = int(os.getenv("CACHE_WARM_CATEGORIES", "50"))
+
+# The public routes' default page sizes; other sizes are never cached
+PAGE_SIZE = 10
+HIGHLIGHTED_LIMIT = 12
+CATEGORY_INDEX_KEY = "categories:index"
+
+_local = {}  # key -> (body or None for a miss, expires_at), this process' copy of cache_entries
+_local_lock = threading.Lock()
+_warmed_categories = (None, frozenset())  # (category index body, ids of the categories warmed with it)
+
+
+def highlighted_key(limit: int) -> Optional[str]:
+    return f"products:highlighted:{limit}" if limit == HIGHLIGHTED_LIMIT else None
+
+
+def products_page_key(skip: int, limit: int) -> Optional[str]:
+    if limit == PAGE_SIZE and skip % PAGE_SIZE == 0 and 0 <= skip // PAGE_SIZE < CACHE_WARM_PAGES:
+        return f"products:page:{skip // PAGE_SIZE}"
+    return None
+
+
+def _category_products_key(category_id: int) -> str:
+    return f"categories:{category_id}:products"
+
+
+def category_products_key(category_id: int, skip: int, limit: int) -> Optional[str]:
+    # Only warmed categories, so other categories never cost a cache_entries lookup
+    if skip == 0 and limit == PAGE_SIZE and category_id in warmed_category_ids():
+        return _category_products_key(category_id)
+    return None
+
+
+def warmed_category_ids() -> frozenset:
+    """Ids of the categories warm_keys covers, read from the cached category index."""
+    global _warmed_categories
+    body = lookup(CATEGORY_INDEX_KEY)
+    if body is None:
+        return frozenset()
+    cached_body, ids = _warmed_categories
+    if cached_body is not body:
+        ids = frozenset(c["id"] for c in json.loads(body)[:CACHE_WARM_CATEGORIES])
+        _warmed_categories = (body, ids)
+    return ids
+
+
+def compute(key: str, db):
+    """JSON content of ``key``, exactly as its route renders it uncached."""
+    parts = key.split(":")
+    if parts[:2] == ["products", "highlighted"]:
+        return serialization.product_rows(crud.get_highlighted_products(db, limit=int(parts[2])))
+    if parts[:2] == ["products", "page"]:
+        return serialization.product_rows(crud.get_visible_products(db, skip=int(parts[2]) * PAGE_SIZE, limit=PAGE_SIZE))
+    if key == CATEGORY_INDEX_KEY:
+        return [{"name": c.name, "id": c.id, "product_count": c.product_count} for c in crud.get_category_index(db)]
+    if parts[0] == "categories" and parts[2:] == ["products"]:
+        return serialization.product_rows(crud.get_category_products(db, int(parts[1]), skip=0, limit=PAGE_SIZE))
+    raise KeyError(key)
+
+
+def warm_keys(db) -> list:
+    keys = [highlighted_key(HIGHLIGHTED_LIMIT), CATEGORY_INDEX_KEY]
+    keys += [products_page_key(page * PAGE_SIZE, PAGE_SIZE) for page in range(CACHE_WARM_PAGES)]
+    categories = crud.get_category_index(db)[:CACHE_WARM_CATEGORIES]  # menu order
+    keys += [_category_products_key(c.id) for c in categories]
+    return keys
+
+
+def _remember(key: str, body: Optional[bytes], expires_at: datetime):
+    with _local_lock:
+        _local[key] = (body, expires_at)
+
+
+def lookup(key: Optional[str]) -> Optional[bytes]:
+    """The cached body of ``key`` if it has not expired, else None.
+
+    Misses are remembered for CACHE_CHECK_SECONDS, so a cold or missing entry
+    costs one cache_entries query per interval rather than one per request.
+    """
+    if key is None:
+        return None
+    now = datetime.utcnow()
+    local = _local.get(key)
+    if local is not None and now < local[1]:
+        return local[0]
+    db = SessionLocal()
+    try:
+        entry = crud.get_cache_entry(db, key)
+    finally:
+        db.close()
+    if entry is None or entry.value is None or now >= entry.expires_at:
+        _remember(key, None, now + timedelta(seconds=CACHE_CHECK_SECONDS))
+        return None
+    _remember(key, entry.value, entry.expires_at)
+    return entry.value
+
+
+def cached_response(key: Optional[str]) -> Optional[Response]:
+    body = lookup(key)
+    return Response(content=body, media_type="application/json") if body is not None else None
+
+
+def refresh(key: str, force: bool = False) -> Optional[int]:
+    """Recompute ``key`` if it is due and its lease can be taken; returns the duration in ms.
+
+    Returns None when another process holds the lease, has refreshed the
+    entry within CACHE_REFRESH_AHEAD of its TTL (always due with ``force``),
+    or took the lease over while this one was computing.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+    stale_before = None if force else datetime.utcnow() - timedelta(seconds=CACHE_TTL_SECONDS * CACHE_REFRESH_AHEAD)
+    db = SessionLocal()
+    try:
+        if not crud.acquire_cache_lease(db, key, owner, CACHE_LEASE_SECONDS, stale_before):
+            return None
+        body = None
+        started = time.perf_counter()
+        read_db = ReadSessionLocal()
+        try:
+            body = serialization.dumps(compute(key, read_db))
+        finally:
+            read_db.close()
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            now = datetime.utcnow()
+            # Stores the body, or on failure just gives the lease back
+            stored = crud.store_cache_entry(db, key, owner, body, now, CACHE_TTL_SECONDS, duration_ms)
+        if not stored:  # the lease ran out and another process took over
+            return None
+        _remember(key, body, now + timedelta(seconds=CACHE_TTL_SECONDS))
+        return duration_ms
+    finally:
+        db.close()
+
+
+def refresh_due(force: bool = False) -> dict:
+    """Refresh every warmed entry past CACHE_REFRESH_AHEAD of its TTL (all of them if ``force``).
+
+    Returns {key: duration in ms} for the entries this process refreshed.
+    """
+    db = SessionLocal()
+    try:
+        keys = warm_keys(db)
+        status = {row.key: row for row in crud.get_cache_status(db)}
+        crud.prune_cache_entries(db, keys, datetime.utcnow() - timedelta(hours=1))
+    finally:
+        db.close()
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=CACHE_TTL_SECONDS * CACHE_REFRESH_AHEAD)
+    refreshed = {}
+    for key in keys:
+        entry = status.get(key)
+        # Skip fresh entries up front so idle passes write nothing; the lease re-checks atomically
+        fresh = entry is not None and entry.refreshed_at is not None and now < entry.expires_at
+        if fresh and not force and stale_before <= entry.refreshed_at:
+            continue
+        try:
+            duration_ms = refresh(key, force)
+        except Exception:
+            logger.exception("Refreshing cache entry %s failed", key)
+            continue
+        if duration_ms is not None:
+            refreshed[key] = duration_ms
+    return refreshed
+
+
+def _scheduled_pass() -> bool:
+    refresh_due()
+    return False
+
+
+worker = PeriodicWorker("landing-cache", _scheduled_pass, interval=CACHE_CHECK_SECONDS)
@@ -2,21 +2,27 @@
 
 from fastapi import FastAPI, Depends, HTTPException, status, File, Form, UploadFile, Request
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
-from . import crud, models, schemas, auth, paypal
-from .database import SessionLocal, engine
+from . import crud, models, schemas, auth, webhooks, sqlstats, metrics, profiling, serialization, ratelimit, product_events, recommendations, catalog_io, sales, reservations, compression, landing_cache
+from .database import SessionLocal, ReadSessionLocal, PRIMARY_PIN_COOKIE
 from .auth import authenticate_user, create_access_token, get_current_active_user, admin_required
+import json
 import os
 
-# Initialize the database
-models.Base.metadata.create_all(bind=engine)
+# Schema is managed by Alembic (`alembic upgrade head`, or `python -m app.cli init-db`
+# for a fresh database) and the admin account by `python -m app.cli create-admin`;
+# nothing touches the database at import or startup.
 
-app = FastAPI()
+app = FastAPI(default_response_class=serialization.FastJSONResponse)
+
+# Shed load with 503 before the DB pool is exhausted (MAX_CONCURRENT_REQUESTS).
+# Added before CORSMiddleware so CORS wraps it and the 503s keep their CORS headers.
+app.add_middleware(ratelimit.ConcurrencyLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +32,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for JSON / NDJSON / CSV responses above COMPRESS_MIN_BYTES
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Dev mode: log requests exceeding the SQL statement budget or repeating statements (N+1)
+if sqlstats.SQL_DEBUG:
+    app.add_middleware(sqlstats.QueryBudgetMiddleware)
+
+# Opt-in request profiling: admin X-Profile header / ?profile=1, or PROFILE_SAMPLE_RATE
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Per-route latency / DB / payload metrics, served on /metrics (added last so it wraps everything)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Dependency to get DB session
 def get_db_session():
     db = SessionLocal()
@@ -34,30 +57,68 @@ def get_db_session():
     finally:
         db.close()
 
+# Read-only session for public catalog GETs: the replica (READ_REPLICA_URL) when
+# configured, except for browsers pinned to the primary after an admin write
+def pinned_to_primary(request: Request) -> bool:
+    return auth.primary_pin_active(request.cookies.get(PRIMARY_PIN_COOKIE))
+
+def get_read_db_session(request: Request):
+    db = SessionLocal() if pinned_to_primary(request) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
-def create_admin_user():
-    db = SessionLocal()
-    admin_email = "admin@example.com"
-    admin_password = "your_secure_password"
-
-    existing_user = db.query(models.User).filter(models.User.email == admin_email).first()
-    if not existing_user:
-        hashed_password = auth.hash_password(admin_password)
-        admin_user = models.User(
-            email=admin_email,
-            password=hashed_password,
-            is_admin=True
-        )
-        db.add(admin_user)
-        db.commit()
-        print(f"Admin user '{admin_email}' created.")
-    else:
-        print(f"Admin user '{admin_email}' already exists.")
-    db.close()
 
 @app.on_event("startup")
 def startup_event():
-    create_admin_user()
+    webhooks.workers.start()
+    product_events.start()
+    recommendations.worker.start()
+    sales.worker.start()
+    reservations.sweeper.start()
+    compression.worker.start()
+    if landing_cache.CACHE_WARMING_ENABLED:
+        landing_cache.worker.start()  # first pass warms the landing-page cache
+
+@app.on_event("shutdown")
+def shutdown_event():
+    webhooks.workers.stop()
+    product_events.stop()
+    recommendations.worker.stop()
+    sales.worker.stop()
+    reservations.sweeper.stop()
+    compression.worker.stop()
+    landing_cache.worker.stop()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Admin-only: list captured request profiles, newest first
+@app.get("/admin/profiles")
+def read_profiles(current_user: models.User = Depends(admin_required)):
+    return profiling.list_profiles()
+
+# Admin-only: download a profile as folded stacks (flamegraph.pl / speedscope input)
+@app.get("/admin/profiles/{profile_id}")
+def read_profile(profile_id: str, current_user: models.User = Depends(admin_required)):
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+# Admin-only: landing-page cache entries with their last refresh time and duration
+@app.get("/admin/cache", response_model=List[schemas.CacheEntryStatus])
+def read_cache_status(db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    now = datetime.utcnow()
+    return [
+        {**row._asdict(), "refreshing": row.lease_until is not None and row.lease_until > now}
+        for row in crud.get_cache_status(db)
+    ]
 
 # Endpoint to create a new user
 @app.post("/users/", response_model=schemas.User)
@@ -68,7 +129,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db_session))
     return crud.create_user(db=db, user=user)
 
 # Endpoint to generate JWT token for authentication
-@app.post("/token", response_model=schemas.Token)
+@app.post("/token", response_model=schemas.Token, dependencies=[Depends(ratelimit.limit("token"))])
 def login_for_access_token(db: Session = Depends(get_db_session), form_data: OAuth2PasswordRequestForm = Depends()):
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -101,23 +162,124 @@ management of visibility and pricing/discounts and listing all.
 
 # Public endpoint to get a list of visible products
 @app.get("/products/", response_model=List[schemas.Product])
-def read_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session)):
+def read_products(request: Request, skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db_session)):
+    cached = None if pinned_to_primary(request) else landing_cache.cached_response(landing_cache.products_page_key(skip, limit))
+    if cached is not None:
+        return cached
     products = crud.get_visible_products(db, skip=skip, limit=limit)
-    return products
+    return serialization.FastJSONResponse(serialization.product_rows(products))
+
+# Query parameters shared by the product search endpoints
+def product_search_params(
+    q: Optional[str] = None,
+    type: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    series: Optional[str] = None,
+    rarity: Optional[str] = None,
+    min_height: Optional[float] = None,
+    max_height: Optional[float] = None,
+    min_length: Optional[float] = None,
+    max_length: Optional[float] = None,
+    min_width: Optional[float] = None,
+    max_width: Optional[float] = None,
+    skip: int = 0,
+    limit: int = 20,
+):
+    return dict(
+        q=q,
+        product_type=type,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        series=series,
+        rarity=rarity,
+        min_height=min_height,
+        max_height=max_height,
+        min_length=min_length,
+        max_length=max_length,
+        min_width=min_width,
+        max_width=max_width,
+        skip=max(0, skip),
+        limit=max(1, min(limit, 100)),
+    )
+
+# Search results in the ProductSearchResult shape, skipping per-item pydantic validation
+def _search_response(result: dict):
+    return serialization.FastJSONResponse({**result, "items": serialization.product_rows(result["items"])})
+
+# Static /products/... routes must be declared before /products/{product_id}
+
+# Public: search visible products by name and attributes, with facet counts
+@app.get("/products/search", response_model=schemas.ProductSearchResult)
+def search_products(params: dict = Depends(product_search_params), db: Session = Depends(get_read_db_session)):
+    return _search_response(crud.search_products(db, is_visible=True, **params))
+
+# Admin-only: search all products, optionally filtering on visibility
+@app.get("/products/all/search", response_model=schemas.ProductSearchResult)
+def search_all_products(is_visible: Optional[bool] = None, params: dict = Depends(product_search_params), db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    return _search_response(crud.search_products(db, is_visible=is_visible, **params))
+
+# Public: highlighted products for landing page
+@app.get("/products/highlighted", response_model=List[schemas.Product])
+def highlighted_products(request: Request, limit: int = 12, db: Session = Depends(get_read_db_session)):
+    cached = None if pinned_to_primary(request) else landing_cache.cached_response(landing_cache.highlighted_key(limit))
+    if cached is not None:
+        return cached
+    return serialization.FastJSONResponse(serialization.product_rows(crud.get_highlighted_products(db, limit=limit)))
+
+# Public: most viewed (or sold) visible products over the last `days` days or `hours` hours
+@app.get("/products/trending", response_model=List[schemas.Product])
+def trending_products(metric: str = "views", days: int = 7, hours: Optional[int] = None, limit: int = 12, db: Session = Depends(get_read_db_session)):
+    if metric not in ("views", "sales"):
+        raise HTTPException(status_code=400, detail="metric must be 'views' or 'sales'")
+    products = crud.get_trending_products(db, metric=metric, days=days, hours=hours, limit=max(1, min(limit, 100)))
+    return serialization.FastJSONResponse(serialization.product_rows(products))
+
+# Admin-only: list all products (including hidden)
+@app.get("/products/all", response_model=List[schemas.Product])
+def read_all_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    return serialization.FastJSONResponse(serialization.product_rows(crud.get_products(db, skip=skip, limit=limit)))
+
+# Admin-only: bulk upsert products from a CSV or JSONL upload (format guessed from the file name)
+@app.post("/products/import", response_model=schemas.CatalogImportResult)
+def import_products(file: UploadFile = File(...), format: Optional[str] = Form(None), db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    fmt = format or catalog_io.guess_format(file.filename)
+    if fmt not in catalog_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(catalog_io.FORMATS)}")
+    return catalog_io.import_products(db, catalog_io.read_records(file.file, fmt))
+
+# Admin-only: stream the whole catalog as CSV or JSONL
+@app.get("/products/export")
+def export_products(format: str = "csv", current_user: models.User = Depends(admin_required)):
+    if format not in catalog_io.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(catalog_io.FORMATS)}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    return StreamingResponse(catalog_io.stream_export(format), media_type=media_type, headers=headers)
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
-def get_product(product_id: int, db: Session = Depends(get_db_session)):
+def get_product(product_id: int, db: Session = Depends(get_read_db_session)):
     db_product = crud.get_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
+# Public: "frequently bought together" products, precomputed from order history
+@app.get("/products/{product_id}/related", response_model=List[schemas.Product])
+def related_products(product_id: int, limit: int = 8, db: Session = Depends(get_read_db_session)):
+    products = crud.get_related_products(db, product_id, limit=max(1, min(limit, 20)))
+    return serialization.FastJSONResponse(serialization.product_rows(products))
+
 # Public: register a product view (call from product page render)
-@app.post("/products/{product_id}/view", response_model=schemas.Product)
-def register_product_view(product_id: int, db: Session = Depends(get_db_session)):
-    db_product = crud.increment_product_view(db, product_id)
+@app.post("/products/{product_id}/view", response_model=schemas.Product, dependencies=[Depends(ratelimit.limit("product_view"))])
+def register_product_view(product_id: int, db: Session = Depends(get_read_db_session)):
+    # Views are buffered and logged in batches; counters catch up via the rollup job
+    db_product = crud.get_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_events.record_view(product_id)
     return db_product
 
 # Secure endpoint to update a product by ID
@@ -136,10 +298,31 @@ def delete_product(product_id: int, db: Session = Depends(get_db_session), curre
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
-# Admin-only: list all products (including hidden)
-@app.get("/products/all", response_model=List[schemas.Product])
-def read_all_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
-    return crud.get_products(db, skip=skip, limit=limit)
+# Admin-only: bulk field updates over ids / a category / a subtype, each a single UPDATE
+# (declared before the /products/{product_id}/... routes they would otherwise match)
+def _selection(payload: schemas.ProductSelection) -> dict:
+    return {"ids": payload.ids, "category_id": payload.category_id, "product_type": payload.product_type}
+
+@app.patch("/products/bulk/visibility", response_model=schemas.BulkUpdateResult)
+def bulk_set_product_visibility(payload: schemas.ProductBulkVisibilityUpdate, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    try:
+        return {"updated": crud.bulk_set_product_visibility(db, payload.is_visible, **_selection(payload))}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.patch("/products/bulk/price", response_model=schemas.BulkUpdateResult)
+def bulk_update_product_price(payload: schemas.ProductBulkPriceUpdate, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    try:
+        return {"updated": crud.bulk_update_product_price(db, payload.price, **_selection(payload))}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.patch("/products/bulk/discount", response_model=schemas.BulkUpdateResult)
+def bulk_apply_product_discount(payload: schemas.ProductBulkDiscountUpdate, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    try:
+        return {"updated": crud.bulk_apply_product_discount(db, payload.mode, payload.value, **_selection(payload))}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Admin-only: set product visibility
 @app.patch("/products/{product_id}/visibility", response_model=schemas.Product)
@@ -171,11 +354,6 @@ def apply_product_discount(product_id: int, payload: schemas.ProductDiscountUpda
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
 
-# Public: highlighted products for landing page
-@app.get("/products/highlighted", response_model=List[schemas.Product])
-def highlighted_products(limit: int = 12, db: Session = Depends(get_db_session)):
-    return crud.get_highlighted_products(db, limit=limit)
-
 @app.post("/products/3d", response_model=schemas.Product)
 def create_product_3d(product: schemas.Product3DCreate, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
     return crud.create_product_3d(db=db, product=product)
@@ -199,7 +377,7 @@ def create_product_media(
 @app.get("/product_media/product/{product_id}", response_model=List[schemas.ProductMedia])
 def get_media_for_product(
     product_id: int,
-    db: Session = Depends(get_db_session),
+    db: Session = Depends(get_read_db_session),
 ):
     return crud.get_media_for_product(db=db, product_id=product_id)
 
@@ -235,18 +413,20 @@ def upload_product_media(
     db.add(db_media)
     db.commit()
     db.refresh(db_media)
+    compression.worker.wake()  # gzip/brotli variants are made in the background
     return db_media
 
+# Public: media bytes, as the stored gzip/brotli variant when the client accepts one
 @app.get("/media/{media_id}")
-def get_media_file(media_id: int, db: Session = Depends(get_db_session)):
-    media = db.query(models.Model3DMedia).filter(models.Model3DMedia.id == media_id).first()
+def get_media_file(media_id: int, request: Request, db: Session = Depends(get_read_db_session)):
+    encodings = compression.preferred_encodings(request.headers.get("accept-encoding", ""))
+    media = crud.get_product_media_file(db, media_id, encodings)
     if not media:
         raise HTTPException(status_code=404, detail="Media not found")
-    return Response(
-        content=media.data,
-        media_type=media.content_type,
-        headers={"Content-Disposition": f"inline; filename={media.filename}"}
-    )
+    headers = {"Content-Disposition": f"inline; filename={media.filename}", "Vary": "Accept-Encoding"}
+    if media.encoding != "identity":
+        headers["Content-Encoding"] = media.encoding
+    return Response(content=media.body, media_type=media.content_type, headers=headers)
 
 # Secure endpoint to create a new category
 @app.post("/categories/", response_model=schemas.Category)
@@ -255,22 +435,73 @@ def create_category(category: schemas.CategoryBase, db: Session = Depends(get_db
 
 # Public endpoint to get a list of categories
 @app.get("/categories/", response_model=List[schemas.Category])
-def read_categories(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session)):
+def read_categories(skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db_session)):
     categories = crud.get_categories(db, skip=skip, limit=limit)
     return categories
 
+# Public: category menu with visible product counts
+@app.get("/categories/index", response_model=List[schemas.CategorySummary])
+def read_category_index(request: Request, db: Session = Depends(get_read_db_session)):
+    cached = None if pinned_to_primary(request) else landing_cache.cached_response(landing_cache.CATEGORY_INDEX_KEY)
+    if cached is not None:
+        return cached
+    return crud.get_category_index(db)
+
+# Public: paginated visible products of one category
+@app.get("/categories/{category_id}/products", response_model=List[schemas.Product])
+def read_category_products(request: Request, category_id: int, skip: int = 0, limit: int = 10, db: Session = Depends(get_read_db_session)):
+    cached = None if pinned_to_primary(request) else landing_cache.cached_response(landing_cache.category_products_key(category_id, skip, limit))
+    if cached is not None:
+        return cached
+    if crud.get_category(db, category_id) is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    products = crud.get_category_products(db, category_id, skip=skip, limit=limit)
+    return serialization.FastJSONResponse(serialization.product_rows(products))
+
 # Secure endpoint to create a new order
 @app.post("/orders/", response_model=schemas.Order)
 def create_order(order: schemas.OrderBase, db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
-    return crud.create_order(db=db, order=order)
+    db_order = crud.create_order(db=db, order=order)
+    if db_order is None:
+        raise HTTPException(status_code=409, detail="PayPal order id is already used by another order")
+    return db_order
 
 # Public endpoint to get a list of orders (usually this would be secure, but depends on your needs)
 @app.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session)):
-    orders = crud.get_orders(db, skip=skip, limit=limit)
+def read_orders(skip: int = 0, limit: int = 10, status: Optional[str] = None, db: Session = Depends(get_db_session)):
+    orders = crud.get_orders(db, skip=skip, limit=limit, status=status)
     return orders
 
-@app.post("/guest_orders/", response_model=schemas.Order)
+# Admin-only: stream orders with their lines as CSV (one row per line) or JSONL (one order per line)
+@app.get("/orders/export")
+def export_orders(format: str = "jsonl", status: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None, current_user: models.User = Depends(admin_required)):
+    if format not in sales.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(sales.FORMATS)}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    return StreamingResponse(sales.stream_export(format, status=status, start=start, end=end), media_type=media_type, headers=headers)
+
+# Admin-only: paid orders, units and revenue per day of payment (default: the last 30 days), from the sales rollups
+@app.get("/reports/sales/daily", response_model=schemas.DailySalesReport)
+def daily_sales_report(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    return {"as_of": crud.get_sales_rollup_time(db), "days": crud.get_daily_sales(db, start, end)}
+
+# Admin-only: best-selling products by paid revenue over a date range (default: the last 30 days)
+@app.get("/reports/sales/products", response_model=schemas.ProductSalesReport)
+def product_sales_report(start: Optional[date] = None, end: Optional[date] = None, limit: int = 50, product_id: Optional[int] = None, db: Session = Depends(get_db_session), current_user: models.User = Depends(admin_required)):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    products = crud.get_product_sales(db, start, end, limit=max(1, min(limit, 500)), product_id=product_id)
+    return {"as_of": crud.get_sales_rollup_time(db), "products": products}
+
+# Secure endpoint: order history of the current user, newest first
+@app.get("/users/me/orders", response_model=List[schemas.Order])
+def read_my_orders(skip: int = 0, limit: int = 10, db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
+    return crud.get_user_orders(db, user_id=current_user.id, skip=skip, limit=limit)
+
+@app.post("/guest_orders/", response_model=schemas.Order, dependencies=[Depends(ratelimit.limit("guest_orders"))])
 def create_guest_order(order: schemas.GuestOrderBase, db: Session = Depends(get_db_session)):
     return crud.create_guest_order(db=db, order=order)
 
@@ -280,9 +511,10 @@ class CreatePayPalOrder(BaseModel):
     amount: float
 
 
-@app.post("/paypal/create-order")
+@app.post("/paypal/create-order", dependencies=[Depends(ratelimit.limit("paypal"))])
 def paypal_create_order(payload: CreatePayPalOrder):
     """Create a PayPal order directly from the frontend."""
+    from . import paypal  # imported on first use; keeps requests off the boot path
     return paypal.create_order(
         amount=payload.amount,
         return_url=os.getenv("PAYPAL_RETURN_URL", "https://example.com/success"),
@@ -290,44 +522,79 @@ def paypal_create_order(payload: CreatePayPalOrder):
     )
 
 
-@app.post("/paypal/order/{order_id}")
-def create_paypal_order(order_id: int, db: Session = Depends(get_db_session)):
+# Starts PayPal checkout for an order: its stock is held for RESERVATION_TTL_SECONDS
+# from the first call (409 if a product is short, the order is paid or that window
+# has passed) and released again if PayPal rejects the order. Orders of registered
+# users can only be checked out by their owner (or an admin).
+@app.post("/paypal/order/{order_id}", dependencies=[Depends(ratelimit.limit("paypal"))])
+def create_paypal_order(order_id: int, db: Session = Depends(get_db_session), current_user: Optional[models.User] = Depends(auth.get_optional_user)):
     order = crud.get_order(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    res = paypal.create_order(
-        amount=float(order.total_cost),
-        return_url=os.getenv("PAYPAL_RETURN_URL", "https://example.com/success"),
-        cancel_url=os.getenv("PAYPAL_CANCEL_URL", "https://example.com/cancel"),
-    )
+    if order.user_id is not None:
+        if current_user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        if current_user.id != order.user_id and not current_user.is_admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your order")
+    amount = float(order.total_cost)
+    try:
+        reserved_until = crud.reserve_order_stock(db, order_id, reservations.RESERVATION_TTL_SECONDS)
+    except (crud.InsufficientStock, crud.CheckoutClosed) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    from . import paypal
+    try:
+        res = paypal.create_order(
+            amount=amount,
+            return_url=os.getenv("PAYPAL_RETURN_URL", "https://example.com/success"),
+            cancel_url=os.getenv("PAYPAL_CANCEL_URL", "https://example.com/cancel"),
+        )
+    except Exception:
+        crud.release_order_stock(db, order_id)
+        raise
     crud.set_paypal_order_id(db, order_id, res.get("id"))
-    return res
+    return {**res, "reserved_until": reserved_until}
 
 
 @app.post("/paypal/capture-order/{paypal_order_id}")
 def capture_paypal_order(paypal_order_id: str):
     """Capture a previously created PayPal order."""
+    from . import paypal
     return paypal.capture_order(paypal_order_id)
 
 
-@app.post("/paypal/webhook")
+# PayPal webhook headers needed later for signature verification
+WEBHOOK_HEADERS = (
+    "paypal-transmission-id",
+    "paypal-transmission-time",
+    "paypal-cert-url",
+    "paypal-auth-algo",
+    "paypal-transmission-sig",
+)
+
+
+@app.post("/paypal/webhook", dependencies=[Depends(ratelimit.limit("paypal_webhook"))])
 async def paypal_webhook(request: Request, db: Session = Depends(get_db_session)):
-    body = await request.json()
-    if not paypal.verify_webhook(request.headers, body):
+    """Durably queue the raw event and ack; verification and order updates
+    happen in the webhook worker pool (see app/webhooks.py)."""
+    raw = await request.body()
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook")
+    event_id = body.get("id") if isinstance(body, dict) else None
+    headers = {name: request.headers.get(name) for name in WEBHOOK_HEADERS}
+    if not event_id or not headers["paypal-transmission-sig"]:
         raise HTTPException(status_code=400, detail="Invalid webhook")
-    event_type = body.get("event_type")
-    if event_type == "CHECKOUT.ORDER.APPROVED":
-        order_id = body["resource"]["id"]
-        order = crud.get_order_by_paypal_id(db, order_id)
-        if order:
-            crud.update_order_status(db, order.id, "APPROVED")
-    elif event_type == "PAYMENT.CAPTURE.COMPLETED":
-        related = body["resource"].get("supplementary_data", {}).get("related_ids", {})
-        order_id = related.get("order_id")
-        if order_id:
-            order = crud.get_order_by_paypal_id(db, order_id)
-            if order:
-                crud.update_order_status(db, order.id, "COMPLETED")
+    queued = crud.enqueue_webhook_event(
+        db,
+        event_id=event_id,
+        event_type=body.get("event_type"),
+        headers=json.dumps(headers),
+        body=raw.decode("utf-8"),
+        transmission_sig=headers["paypal-transmission-sig"],
+    )
+    if queued:
+        webhooks.workers.wake()
     return {"status": "ok"}
 
 # Secure endpoint to add an item to the cart
@@ -340,6 +607,27 @@ def add_to_cart(cart: schemas.CartBase, db: Session = Depends(get_db_session), c
 def read_cart(db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
     return crud.get_cart_items(db=db, user_id=current_user.id)
 
+# Secure endpoint: cart items with names, current prices and totals in one call
+@app.get("/cart/summary", response_model=schemas.CartSummary)
+def read_cart_summary(db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
+    return crud.get_cart_summary(db=db, user_id=current_user.id)
+
+# Secure endpoint: apply several add/update/remove operations in one transaction
+@app.post("/cart/batch", response_model=schemas.CartSummary)
+def batch_update_cart(batch: schemas.CartBatch, db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
+    try:
+        return crud.apply_cart_operations(db, current_user.id, batch.operations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Secure endpoint: convert the current user's cart into an order
+@app.post("/cart/checkout", response_model=schemas.Order)
+def checkout_cart(db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
+    try:
+        return crud.checkout_cart(db, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.put("/cart/{cart_id}", response_model=schemas.Cart)
 def update_cart_item(cart_id: int, quantity: int, db: Session = Depends(get_db_session), current_user: models.User = Depends(get_current_active_user)):
     return crud.update_cart_item(db, cart_id, quantity)
@@ -0,0 +1,143 @@
+"""Per-route request metrics exported in Prometheus text format.
+
+MetricsMiddleware records latency (histogram), DB time and statement count,
+response bytes and status codes per route template, plus the number of
+in-flight requests. Stats live in preallocated per-route objects keyed by
+the matched route, and labels are only formatted when /metrics is scraped.
+Updates happen on the event loop thread, so plain integer increments are
+safe without locks.
+"""
+
+import time
+from bisect import bisect_left
+
+from . import sqlstats
+
+# Latency histogram upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteMetrics:
+    __slots__ = ("method", "route", "buckets", "count", "duration", "db_duration", "db_statements", "response_bytes", "statuses")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.duration = 0.0
+        self.db_duration = 0.0
+        self.db_statements = 0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def observe(self, duration: float, status: int, response_bytes: int, db: sqlstats.QueryStats):
+        self.buckets[bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.duration += duration
+        self.db_duration += db.duration
+        self.db_statements += db.count
+        self.response_bytes += response_bytes
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes = {}  # (id of matched route, method) -> RouteMetrics; routes live as long as the app
+        self.in_flight = 0
+
+    def for_route(self, route, method: str) -> RouteMetrics:
+        key = (id(route), method)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            path = getattr(route, "path", None) or "<unmatched>"
+            metrics = self.routes[key] = RouteMetrics(method, path)
+        return metrics
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        routes = sorted(self.routes.values(), key=lambda m: (m.route, m.method))
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for m in routes:
+            labels = f'method="{m.method}",route="{_escape(m.route)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, m.buckets):
+                cumulative += n
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {m.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {m.duration:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {m.count}")
+
+        lines += [
+            "# HELP http_requests_total Requests by route and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for m in routes:
+            labels = f'method="{m.method}",route="{_escape(m.route)}"'
+            for status, n in sorted(m.statuses.items()):
+                lines.append(f'http_requests_total{{{labels},status="{status}"}} {n}')
+
+        for name, attr, help_text in (
+            ("http_request_db_seconds_total", "db_duration", "Time spent executing SQL statements."),
+            ("http_request_db_statements_total", "db_statements", "SQL statements executed."),
+            ("http_response_bytes_total", "response_bytes", "Response body bytes sent."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for m in routes:
+                value = getattr(m, attr)
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f'{name}{{method="{m.method}",route="{_escape(m.route)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding ``registry``; place it outermost."""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+        sqlstats.instrument()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        status = 500
+        response_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        db = sqlstats.QueryStats(keep_statements=False)
+        token = sqlstats.start_recording(db)
+        registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            registry.in_flight -= 1
+            sqlstats.stop_recording(token)
+            registry.for_route(scope.get("route"), scope["method"]).observe(duration, status, response_bytes, db)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, Numeric, ForeignKey, Table, DateTime, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Date, Integer, String, Boolean, Numeric, ForeignKey, Table, DateTime, LargeBinary, Text, Index, DDL, event, func, literal_column, text
+from sqlalchemy.orm import deferred, relationship
 from .database import Base
 from datetime import datetime
 
@@ -8,7 +8,9 @@ product_categories = Table(
     'product_categories',
     Base.metadata,
     Column('product_id', Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True),
-    Column('category_id', Integer, ForeignKey('categories.id', ondelete="CASCADE"), primary_key=True)
+    Column('category_id', Integer, ForeignKey('categories.id', ondelete="CASCADE"), primary_key=True),
+    # The PK covers lookups by product; category filters need their own index
+    Index('ix_product_categories_category_id', 'category_id'),
 )
 
 class User(Base):
@@ -37,7 +39,7 @@ class Product(Base):
 
     name = Column(String, nullable=False)
     quantity = Column(Integer, nullable=False)
-    price = Column(Numeric(10, 2), nullable=False)
+    price = Column(Numeric(10, 2), nullable=False, index=True)
     discount = Column(Numeric(10, 2), nullable=True)
     discounted_price = Column(Numeric(10, 2), nullable=True)
     is_visible = Column(Boolean, nullable=False, default=True)
@@ -74,17 +76,37 @@ class Product(Base):
         "polymorphic_identity": "base",
     }
 
+# Product name search (Postgres only; other dialects fall back to LIKE scans)
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+Index(
+    "ix_products_name_trgm",
+    Product.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_products_name_fts",
+    func.to_tsvector(literal_column("'simple'"), Product.name),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
 class Category(Base):
     __tablename__ = "categories"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, unique=True)
 
+    # Not eager: loading a product's categories must not pull in every
+    # product of those categories. Load explicitly where needed.
     products = relationship(
         "Product",
         secondary=product_categories,
         back_populates="categories",
-        lazy="selectin",
+        lazy="select",
     )
 
 class ThreeDModel(Product):
@@ -106,8 +128,8 @@ class Card(Product):
     __tablename__ = "cards"
 
     id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, index=True)
-    series = Column(String, nullable=True)
-    rarity = Column(String, nullable=True)
+    series = Column(String, nullable=True, index=True)
+    rarity = Column(String, nullable=True, index=True)
     condition = Column(String, nullable=True)
 
     __mapper_args__ = {
@@ -134,10 +156,25 @@ class ProductMedia(Base):
     role = Column(String, nullable=True)   # thumbnail | gallery | source | etc.
     filename = Column(String, nullable=False)
     content_type = Column(String, nullable=False)
-    data = Column(LargeBinary, nullable=False)
+    # File bytes are only loaded when accessed (media download), not with listings
+    data = deferred(Column(LargeBinary, nullable=False))
+    # Precompressed copies for Content-Encoding negotiation; NULL when not worth keeping
+    data_gzip = deferred(Column(LargeBinary, nullable=True))
+    data_br = deferred(Column(LargeBinary, nullable=True))
+    compressed_at = Column(DateTime, nullable=True)  # NULL until the compression worker has seen the file
 
     product = relationship("Product", back_populates="media")
 
+    __table_args__ = (
+        # Queue of files the compression worker has not looked at yet
+        Index(
+            "ix_product_media_uncompressed",
+            "id",
+            postgresql_where=text("compressed_at IS NULL"),
+            sqlite_where=text("compressed_at IS NULL"),
+        ),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -155,12 +192,31 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
     products = relationship("OrderProduct", back_populates="order", cascade="all, delete-orphan", passive_deletes=True)
 
+    __table_args__ = (
+        # Webhook lookups; most orders get a PayPal id only at checkout
+        Index(
+            "ix_orders_paypal_order_id",
+            "paypal_order_id",
+            unique=True,
+            postgresql_where=text("paypal_order_id IS NOT NULL"),
+            sqlite_where=text("paypal_order_id IS NOT NULL"),
+        ),
+        # Order history per user, newest first
+        Index("ix_orders_user_id_date", "user_id", "date"),
+        # Listing by status, newest first
+        Index("ix_orders_status_date", "status", "date"),
+        # Unfiltered listing, newest first (id breaks ties)
+        Index("ix_orders_date_id", "date", "id"),
+    )
+
 class OrderProduct(Base):
     __tablename__ = "order_products"
 
     order_id = Column(Integer, ForeignKey('orders.id', ondelete="CASCADE"), primary_key=True)
     product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
     quantity = Column(Integer, nullable=False)
+    # Price paid per unit when the order was placed (NULL on older orders)
+    unit_price = Column(Numeric(10, 2), nullable=True)
 
     order = relationship("Order", back_populates="products")
     product = relationship("Product")
@@ -176,3 +232,191 @@ class Cart(Base):
 
     user = relationship("User", back_populates="cart", passive_deletes=True)
     product = relationship("Product")
+
+    __table_args__ = (
+        # One row per product in a user's cart; adds upsert into it
+        Index("ux_cart_user_id_product_id", "user_id", "product_id", unique=True),
+    )
+
+
+class WebhookEvent(Base):
+    """Raw PayPal webhook delivery, queued for background processing."""
+
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True)
+    # PayPal event id. Deliveries are unverified when stored, so the id alone
+    # cannot dedupe them (a forgery would shadow the genuine event): repeats
+    # of the same delivery (id and signature) are dropped on insert, and
+    # verified repeats of an already processed event end as 'duplicate'.
+    event_id = Column(String, nullable=False)
+    transmission_sig = Column(Text, nullable=False, default="")
+    event_type = Column(String, nullable=True)
+    headers = Column(Text, nullable=False)  # JSON of the paypal-* transmission headers
+    body = Column(Text, nullable=False)     # raw request body, kept verbatim for signature checks
+    status = Column(String, nullable=False, default="pending")  # pending | processing | done | duplicate | invalid | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_webhook_events_status_next_attempt_at", "status", "next_attempt_at"),
+        Index("ux_webhook_events_event_id_transmission_sig", "event_id", "transmission_sig", unique=True),
+    )
+
+
+class ProductEvent(Base):
+    """Append-only log of product views and sales, rolled up into product_stats_*.
+
+    Views are buffered in memory and written in batches (app/product_events.py),
+    one row per product and hour with ``quantity`` views; sales are written with
+    the order that caused them.
+    """
+
+    __tablename__ = "product_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), nullable=False)
+    kind = Column(String(16), nullable=False)  # view | sale
+    quantity = Column(Integer, nullable=False, default=1)
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class ProductStatsHourly(Base):
+    __tablename__ = "product_stats_hourly"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # start of the hour (UTC)
+    views = Column(Integer, nullable=False, default=0)
+    sales = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Trending windows scan a range of buckets across all products
+        Index("ix_product_stats_hourly_bucket", "bucket"),
+    )
+
+
+class ProductStatsDaily(Base):
+    __tablename__ = "product_stats_daily"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+    sales = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_product_stats_daily_day", "day"),
+    )
+
+
+class JobCursor(Base):
+    """Progress marker of an incremental background job (e.g. last rolled-up event id)."""
+
+    __tablename__ = "job_cursors"
+
+    name = Column(String(64), primary_key=True)
+    position = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class ProductPair(Base):
+    """How many orders contained both products; stored in both directions."""
+
+    __tablename__ = "product_pairs"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    related_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class RelatedProduct(Base):
+    """Top-N "frequently bought together" products per product, derived from product_pairs."""
+
+    __tablename__ = "product_related"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)  # 1 = most often bought together
+    related_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), nullable=False)
+    score = Column(Integer, nullable=False)
+
+
+class OrderPayment(Base):
+    """Append-only log of orders becoming paid (COMPLETED), rolled up into sales_daily."""
+
+    __tablename__ = "order_payments"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete="CASCADE"), nullable=False, index=True)
+    paid_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SalesDaily(Base):
+    """Paid orders per day of payment, maintained incrementally from order_payments (crud.roll_up_sales)."""
+
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_product_sales_daily_day", "day"),
+    )
+
+
+class StockReservation(Base):
+    """Stock held for an order between PayPal checkout and payment.
+
+    The held quantity is already subtracted from products.quantity; an
+    expired or released hold gives it back, a converted one keeps it sold.
+    """
+
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False, default="active")  # active | converted | released | expired
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # The sweeper only ever looks at active holds, oldest expiry first
+        Index(
+            "ix_stock_reservations_active_expires_at",
+            "expires_at",
+            postgresql_where=text("status = 'active'"),
+            sqlite_where=text("status = 'active'"),
+        ),
+    )
+
+
+class CacheEntry(Base):
+    """Precomputed JSON body of a hot public page, refreshed ahead of expiry (app/landing_cache.py).
+
+    The lease columns make refreshes single-flight across processes: only the
+    holder of an unexpired lease recomputes the entry.
+    """
+
+    __tablename__ = "cache_entries"
+
+    key = Column(String(128), primary_key=True)
+    value = Column(LargeBinary, nullable=True)  # NULL until first computed
+    refreshed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=True)  # time the last refresh took
+    lease_owner = Column(String(64), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
@@ -1,10 +1,22 @@
+import base64
+import hashlib
+import logging
 import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urlparse
 import requests
 
+logger = logging.getLogger(__name__)
+
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
 PAYPAL_SECRET = os.getenv("PAYPAL_SECRET")
 PAYPAL_BASE = os.getenv("PAYPAL_BASE", "https://api-m.sandbox.paypal.com")
 PAYPAL_WEBHOOK_ID = os.getenv("PAYPAL_WEBHOOK_ID")
+# Optional directory for caching PayPal signing certificates across restarts
+PAYPAL_CERT_CACHE_DIR = os.getenv("PAYPAL_CERT_CACHE_DIR")
 
 
 def _get_access_token():
@@ -46,7 +58,109 @@ def capture_order(order_id: str):
     return r.json()
 
 
-def verify_webhook(headers: dict, body: dict) -> bool:
+# --- Webhook signature verification ---
+
+# Signing certificates keyed by cert URL
+_cert_cache = {}
+_cert_lock = threading.Lock()
+
+
+def _check_cert_url(cert_url: str):
+    # Only ever fetch certificates from PayPal's own hosts over HTTPS
+    parsed = urlparse(cert_url or "")
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme != "https" or not (host == "paypal.com" or host.endswith(".paypal.com")):
+        raise ValueError(f"Untrusted cert url: {cert_url!r}")
+
+
+def _cert_cache_path(cert_url: str) -> Optional[str]:
+    if not PAYPAL_CERT_CACHE_DIR:
+        return None
+    name = hashlib.sha256(cert_url.encode("utf-8")).hexdigest() + ".pem"
+    return os.path.join(PAYPAL_CERT_CACHE_DIR, name)
+
+
+def _cert_is_current(cert) -> bool:
+    # cryptography >= 42 exposes timezone-aware validity bounds
+    if hasattr(cert, "not_valid_after_utc"):
+        start, end = cert.not_valid_before_utc, cert.not_valid_after_utc
+    else:
+        start = cert.not_valid_before.replace(tzinfo=timezone.utc)
+        end = cert.not_valid_after.replace(tzinfo=timezone.utc)
+    return start <= datetime.now(timezone.utc) <= end
+
+
+def _get_cert(cert_url: str):
+    """Return the signing certificate for ``cert_url``, from memory, disk or PayPal."""
+    from cryptography import x509
+
+    cert = _cert_cache.get(cert_url)
+    if cert is not None and _cert_is_current(cert):
+        return cert
+
+    _check_cert_url(cert_url)
+    with _cert_lock:
+        cert = _cert_cache.get(cert_url)
+        if cert is not None and _cert_is_current(cert):
+            return cert
+        path = _cert_cache_path(cert_url)
+        pem = None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                pem = f.read()
+            cert = x509.load_pem_x509_certificate(pem)
+            if not _cert_is_current(cert):
+                pem = None
+        if pem is None:
+            r = requests.get(cert_url, timeout=10)
+            r.raise_for_status()
+            pem = r.content
+            cert = x509.load_pem_x509_certificate(pem)
+            if path:
+                os.makedirs(PAYPAL_CERT_CACHE_DIR, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(pem)
+                os.replace(tmp, path)
+        _cert_cache[cert_url] = cert
+        return cert
+
+
+def verify_webhook_locally(headers: dict, raw_body: bytes) -> bool:
+    """Check the transmission signature against PayPal's signing certificate.
+
+    The signed message is ``<transmission_id>|<transmission_time>|<webhook_id>|<crc32(body)>``.
+    Raises if the check cannot be performed (missing headers, unsupported
+    algorithm, certificate fetch errors, ``cryptography`` not installed).
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    transmission_id = headers.get("paypal-transmission-id")
+    transmission_time = headers.get("paypal-transmission-time")
+    transmission_sig = headers.get("paypal-transmission-sig")
+    auth_algo = headers.get("paypal-auth-algo")
+    if not (transmission_id and transmission_time and transmission_sig and PAYPAL_WEBHOOK_ID):
+        raise ValueError("Missing webhook transmission headers")
+    if auth_algo != "SHA256withRSA":
+        raise ValueError(f"Unsupported auth algorithm: {auth_algo!r}")
+
+    cert = _get_cert(headers.get("paypal-cert-url"))
+    message = f"{transmission_id}|{transmission_time}|{PAYPAL_WEBHOOK_ID}|{zlib.crc32(raw_body)}"
+    try:
+        cert.public_key().verify(
+            base64.b64decode(transmission_sig),
+            message.encode("utf-8"),
+            padding.PKCS1v15(),
+            hashes.SHA256(),
+        )
+    except InvalidSignature:
+        return False
+    return True
+
+
+def verify_webhook_remotely(headers: dict, body: dict) -> bool:
     token = _get_access_token()
     payload = {
         "transmission_id": headers.get("paypal-transmission-id"),
@@ -69,3 +183,15 @@ def verify_webhook(headers: dict, body: dict) -> bool:
     r.raise_for_status()
     data = r.json()
     return data.get("verification_status") == "SUCCESS"
+
+
+def verify_webhook(headers: dict, body: dict, raw_body: Optional[bytes] = None) -> bool:
+    """Verify locally when the raw body is available, else (or on failure) ask PayPal."""
+    if raw_body is not None:
+        try:
+            if verify_webhook_locally(headers, raw_body):
+                return True
+            logger.warning("Local webhook signature check failed; asking PayPal")
+        except Exception as e:
+            logger.warning("Local webhook verification unavailable (%s); asking PayPal", e)
+    return verify_webhook_remotely(headers, body)
@@ -0,0 +1,99 @@
+"""Buffered product view events and the rollup of the event log into stats tables.
+
+Views are counted in memory per product and hour and written to
+product_events in one batch every PRODUCT_EVENT_FLUSH_SECONDS, so a view
+costs a dict update instead of a write to the products row. The rollup
+worker folds new events (views and the sales crud writes with orders) into
+product_stats_hourly / product_stats_daily and the denormalized counters on
+products, and prunes rolled-up history past its retention.
+
+Views still buffered when a worker dies are lost; that is the price of
+keeping them off the request path.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from . import crud
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_EVENT_FLUSH_SECONDS = float(os.getenv("PRODUCT_EVENT_FLUSH_SECONDS", "5"))
+PRODUCT_EVENT_ROLLUP_SECONDS = float(os.getenv("PRODUCT_EVENT_ROLLUP_SECONDS", "30"))
+PRODUCT_EVENT_ROLLUP_BATCH = int(os.getenv("PRODUCT_EVENT_ROLLUP_BATCH", "5000"))
+PRODUCT_EVENT_GRACE_SECONDS = float(os.getenv("PRODUCT_EVENT_GRACE_SECONDS", "30"))
+PRODUCT_EVENT_RETENTION_DAYS = int(os.getenv("PRODUCT_EVENT_RETENTION_DAYS", "30"))
+PRODUCT_STATS_HOURLY_RETENTION_DAYS = int(os.getenv("PRODUCT_STATS_HOURLY_RETENTION_DAYS", "14"))
+PRUNE_INTERVAL_SECONDS = 3600
+
+_lock = threading.Lock()
+_views = {}  # (product_id, hour) -> [count, last seen at]
+_last_prune = 0.0
+
+
+def record_view(product_id: int):
+    now = datetime.utcnow()
+    key = (product_id, now.replace(minute=0, second=0, microsecond=0))
+    with _lock:
+        entry = _views.get(key)
+        if entry is None:
+            _views[key] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+
+
+def flush_views() -> bool:
+    """Write buffered views as one product_events row per product and hour."""
+    global _views
+    with _lock:
+        if not _views:
+            return False
+        pending, _views = _views, {}
+    rows = [
+        {"product_id": pid, "kind": "view", "quantity": count, "occurred_at": last_seen}
+        for (pid, _), (count, last_seen) in pending.items()
+    ]
+    db = SessionLocal()
+    try:
+        crud.insert_product_events(db, rows)
+    except Exception:
+        db.rollback()
+        # Views of products deleted meanwhile fail the FK; drop the batch rather than retry forever
+        logger.exception("Dropping %d buffered view events", sum(r["quantity"] for r in rows))
+    finally:
+        db.close()
+    return False
+
+
+def roll_up() -> bool:
+    global _last_prune
+    db = SessionLocal()
+    try:
+        processed = crud.roll_up_product_events(db, PRODUCT_EVENT_ROLLUP_BATCH, PRODUCT_EVENT_GRACE_SECONDS)
+        if not processed and time.monotonic() - _last_prune >= PRUNE_INTERVAL_SECONDS:
+            _last_prune = time.monotonic()
+            crud.prune_product_events(db, PRODUCT_EVENT_RETENTION_DAYS, PRODUCT_STATS_HOURLY_RETENTION_DAYS)
+        return processed >= PRODUCT_EVENT_ROLLUP_BATCH
+    finally:
+        db.close()
+
+
+flusher = PeriodicWorker("product-event-flush", flush_views, interval=PRODUCT_EVENT_FLUSH_SECONDS)
+rollup = PeriodicWorker("product-event-rollup", roll_up, interval=PRODUCT_EVENT_ROLLUP_SECONDS)
+
+
+def start():
+    flusher.start()
+    rollup.start()
+
+
+def stop():
+    flusher.stop()
+    rollup.stop()
+    flush_views()  # don't lose the tail of the buffer on a clean shutdown
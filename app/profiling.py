@@ -0,0 +1,208 @@
+"""Opt-in stack-sampling profiler for individual requests.
+
+A request is profiled when an admin sends ``X-Profile: 1`` (or adds
+``?profile=1``), or at random with probability ``PROFILE_SAMPLE_RATE``.
+While it runs, a sampler thread snapshots the Python stacks of busy
+threads (the event loop and the threadpool running sync endpoints) every
+``PROFILE_INTERVAL`` seconds. The result is written to ``PROFILE_DIR`` in
+folded-stack format, ready for flamegraph.pl or speedscope, and served by
+the admin /admin/profiles endpoints; flagged requests get its id back in
+the ``X-Profile-Id`` response header.
+
+Stacks are sampled per process, so other requests served concurrently by
+the same worker can show up in a profile. Requests that are not selected
+only pay for a header lookup.
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+
+from . import auth, crud
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+SAMPLER_THREAD_NAME = "profile-sampler"
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{6}-[A-Za-z0-9_.-]+$")
+
+# Leaf frames of threads that are parked rather than doing work
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+def _fold(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Counts folded stacks of busy threads, sampled every ``interval`` seconds."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SAMPLER_THREAD_NAME, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, f"thread-{ident}")
+                if name == SAMPLER_THREAD_NAME or _is_idle(frame):
+                    continue
+                self.stacks[_fold(frame, name)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _new_profile_id(scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", scope["path"].strip("/")) or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.urandom(3).hex()}-{scope['method']}_{slug[:80]}"
+
+
+def profile_path(profile_id: str, directory: str = PROFILE_DIR):
+    """Path of a stored profile, or None for unknown or malformed ids."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(directory, profile_id + ".folded")
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles(directory: str = PROFILE_DIR):
+    """Stored profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for filename in os.listdir(directory):
+        if filename.endswith(".folded"):
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            entries.append({"id": filename[: -len(".folded")], "size": stat.st_size, "created_at": stat.st_mtime})
+    entries.sort(key=lambda e: e["created_at"], reverse=True)
+    return entries
+
+
+def save_profile(profile_id: str, sampler: StackSampler, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, profile_id + ".folded"), "w") as f:
+        f.write(sampler.folded())
+    for stale in list_profiles(directory)[keep:]:
+        try:
+            os.remove(os.path.join(directory, stale["id"] + ".folded"))
+        except OSError:
+            pass
+
+
+def _is_admin_token(authorization: str) -> bool:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        email = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+    except JWTError:
+        return False
+    if not email:
+        return False
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_email(db, email=email)
+        return bool(user and user.is_admin)
+    finally:
+        db.close()
+
+
+def _flag_requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true", b"yes")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        return parse_qs(query.decode("latin-1")).get("profile", [""])[0].lower() in ("1", "true", "yes")
+    return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling flagged (admin) or randomly sampled requests."""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, interval: float = PROFILE_INTERVAL, directory: str = PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        flagged = _flag_requested(scope)
+        if flagged:
+            authorization = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"authorization"), "")
+            flagged = await run_in_threadpool(_is_admin_token, authorization)
+        if not flagged and not (self.sample_rate and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = _new_profile_id(scope)
+
+        async def send_wrapper(message):
+            if flagged and message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            try:
+                await run_in_threadpool(save_profile, profile_id, sampler, self.directory)
+            except OSError:
+                logger.exception("Could not store profile %s", profile_id)
@@ -0,0 +1,203 @@
+"""Per-client rate limits for expensive routes and a global concurrency cap.
+
+Routes opt in with a named limit::
+
+    @app.post("/token", dependencies=[Depends(ratelimit.limit("token"))])
+
+Each name maps to a token bucket of ``count`` requests per ``seconds`` per
+client (IP address, or the first X-Forwarded-For hop when
+TRUST_PROXY_HEADERS is set), configured in RATE_LIMITS as
+``name=count/seconds`` pairs. Buckets live in process memory; set
+RATE_LIMIT_REDIS_URL (requires the ``redis`` package) to share them between
+workers. Exhausted buckets answer 429 with Retry-After.
+
+ConcurrencyLimitMiddleware sheds requests with 503 once
+MAX_CONCURRENT_REQUESTS are in flight. By default the limit is the DB pool
+size plus overflow (DB_POOL_SIZE + DB_MAX_OVERFLOW), so excess load is
+refused up front instead of queueing on the pool until it times out.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+from .database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMITS = "token=10/60,guest_orders=5/60,paypal=10/60,product_view=60/60,paypal_webhook=120/60"
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0").lower() in ("1", "true", "yes")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "0")) or max(1, DB_POOL_SIZE + max(0, DB_MAX_OVERFLOW))
+# Paths never shed (monitoring must keep working under load)
+CONCURRENCY_EXEMPT_PATHS = ("/metrics",)
+
+
+def parse_limits(spec: str) -> dict:
+    """``"token=10/60,paypal=5/1"`` -> ``{"token": (10, 60.0), "paypal": (5, 1.0)}``."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        count, _, seconds = rate.partition("/")
+        limits[name.strip()] = (int(count), float(seconds or 1))
+    return limits
+
+
+RATE_LIMITS = {**parse_limits(DEFAULT_RATE_LIMITS), **parse_limits(os.getenv("RATE_LIMITS", ""))}
+
+
+class MemoryBuckets:
+    """Token buckets in process memory, shared by the threads of one worker.
+
+    At most ``max_keys`` buckets are kept. Once full, buckets idle long enough
+    to have refilled are dropped, then the least recently used ones.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at, capacity, rate], least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float):
+        """Take one token; returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [float(capacity), now, capacity, rate]
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            bucket[0] = tokens - 1 if allowed else tokens
+            bucket[1] = now
+            return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, now: float):
+        # Buckets idle long enough to have refilled are equivalent to new ones
+        for key in [k for k, (_, updated, capacity, rate) in self._buckets.items() if now - updated >= capacity / rate]:
+            del self._buckets[key]
+        # Then evict the least recently used, leaving headroom so the sweep above
+        # runs once per max_keys // 10 new clients rather than on every one
+        while self._buckets and len(self._buckets) > self.max_keys - max(1, self.max_keys // 10):
+            self._buckets.popitem(last=False)
+
+
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets in Redis, updated atomically by a Lua script, shared by all workers."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_REDIS_TAKE)
+
+    def take(self, key: str, capacity: int, rate: float):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = RedisBuckets(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBuckets()
+    return _backend
+
+
+def client_key(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def limit(name: str, key_func=client_key):
+    """Dependency enforcing the RATE_LIMITS entry ``name`` per client key."""
+    if name not in RATE_LIMITS:
+        raise KeyError(f"No rate limit configured for {name!r}")
+
+    def check(request: Request):
+        if not RATE_LIMITS_ENABLED:
+            return
+        count, seconds = RATE_LIMITS[name]
+        try:
+            allowed, retry_after = get_backend().take(f"{name}:{key_func(request)}", count, count / seconds)
+        except Exception:
+            # A broken shared backend must not take the routes down with it
+            logger.exception("Rate limit backend failed; allowing request")
+            return
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    return check
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware answering 503 while ``max_concurrent`` requests are in flight."""
+
+    def __init__(self, app, max_concurrent: int = MAX_CONCURRENT_REQUESTS, exempt_paths=CONCURRENCY_EXEMPT_PATHS):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.exempt_paths = exempt_paths
+        self.in_flight = 0  # only touched on the event loop thread
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_concurrent:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Server busy, retry shortly"}'})
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
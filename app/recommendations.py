@@ -0,0 +1,108 @@
+""""Frequently bought together" lists mined from order history.
+
+Pair counts live in product_pairs and the top RELATED_TOP_N per product in
+product_related, so /products/{id}/related is a single indexed read. The
+worker here folds newly paid orders in incrementally (crud.update_related_products);
+``rebuild()`` recounts the whole history, using a sparse order x product
+matrix when scipy is installed and plain Python counting otherwise::
+
+    python -m app.cli rebuild-related
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from . import crud, models
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+RELATED_TOP_N = int(os.getenv("RELATED_TOP_N", "20"))
+RELATED_MAX_ORDER_ITEMS = int(os.getenv("RELATED_MAX_ORDER_ITEMS", "50"))
+RELATED_UPDATE_SECONDS = float(os.getenv("RELATED_UPDATE_SECONDS", "60"))
+RELATED_BATCH_SIZE = int(os.getenv("RELATED_BATCH_SIZE", "1000"))
+RELATED_GRACE_SECONDS = float(os.getenv("RELATED_GRACE_SECONDS", "30"))
+
+
+def count_pairs_sparse(rows, max_items: int = RELATED_MAX_ORDER_ITEMS) -> dict:
+    """Pair counts from (order_id, product_id) rows as C = XᵀX over a binary order x product matrix."""
+    import numpy as np
+    from scipy import sparse
+
+    rows = list(rows)
+    if not rows:
+        return {}
+    order_ids, product_ids = (np.fromiter((r[i] for r in rows), dtype=np.int64, count=len(rows)) for i in (0, 1))
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    products, product_index = np.unique(product_ids, return_inverse=True)
+    x = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (order_index, product_index)),
+        shape=(int(order_index.max()) + 1, len(products)),
+    )
+    x.data[:] = 1  # duplicate order lines were summed; count each product once per order
+    sizes = np.diff(x.indptr)
+    x = x[(sizes >= 2) & (sizes <= max_items)]
+    co = (x.T @ x).tocoo()
+    off_diagonal = co.row != co.col
+    return {
+        (int(products[a]), int(products[b])): int(n)
+        for a, b, n in zip(co.row[off_diagonal], co.col[off_diagonal], co.data[off_diagonal])
+    }
+
+
+def count_pairs_python(rows, max_items: int = RELATED_MAX_ORDER_ITEMS) -> dict:
+    by_order = {}
+    for order_id, product_id in rows:
+        by_order.setdefault(order_id, []).append(product_id)
+    return crud.order_pair_counts(by_order.values(), max_items)
+
+
+def count_pairs(rows, max_items: int = RELATED_MAX_ORDER_ITEMS) -> dict:
+    try:
+        import scipy.sparse  # noqa: F401
+    except ImportError:
+        return count_pairs_python(rows, max_items)
+    return count_pairs_sparse(rows, max_items)
+
+
+def rebuild(top_n: int = RELATED_TOP_N, max_items: int = RELATED_MAX_ORDER_ITEMS):
+    """Recount all pairs from the lines of paid orders and rebuild product_related in one transaction."""
+    db = SessionLocal()
+    try:
+        cursor = crud.lock_job_cursor(db, crud.RELATED_PAYMENTS_CURSOR)
+        if cursor is None:
+            raise RuntimeError("Related products are being updated by another worker; try again")
+        payment = models.OrderPayment
+        last_payment_id = db.query(payment.id).order_by(payment.id.desc()).limit(1).scalar() or 0
+        paid_orders = db.query(payment.order_id).filter(payment.id <= last_payment_id)
+        rows = (
+            db.query(models.OrderProduct.order_id, models.OrderProduct.product_id)
+            .filter(models.OrderProduct.order_id.in_(paid_orders))
+            .yield_per(10000)
+        )
+        counts = count_pairs(rows, max_items)
+        db.query(models.ProductPair).delete(synchronize_session=False)
+        items = sorted(counts.items())
+        for i in range(0, len(items), 5000):
+            crud.add_product_pair_counts(db, dict(items[i:i + 5000]))
+        crud.refresh_related_products(db, None, top_n)
+        cursor.position = last_payment_id
+        cursor.updated_at = datetime.utcnow()
+        db.commit()
+        return {"payments_up_to": last_payment_id, "pairs": len(counts)}
+    finally:
+        db.close()
+
+
+def update() -> bool:
+    db = SessionLocal()
+    try:
+        processed = crud.update_related_products(db, RELATED_BATCH_SIZE, RELATED_GRACE_SECONDS, RELATED_TOP_N, RELATED_MAX_ORDER_ITEMS)
+        return processed >= RELATED_BATCH_SIZE
+    finally:
+        db.close()
+
+
+worker = PeriodicWorker("related-products", update, interval=RELATED_UPDATE_SECONDS)
@@ -0,0 +1,31 @@
+"""Short-lived stock holds between PayPal checkout and payment.
+
+``POST /paypal/order/{id}`` takes the order's quantities off products.quantity
+for RESERVATION_TTL_SECONDS (crud.reserve_order_stock) and answers 409 when a
+product is short, so concurrent buyers cannot all pay for the last unit.
+Repeated calls for an order share its first hold's deadline, so stock cannot
+be held indefinitely by calling again. The PAYMENT.CAPTURE.COMPLETED webhook
+converts the hold into a sale (crud.mark_order_paid); the sweeper here gives
+back the stock of holds that expired unpaid.
+"""
+
+import os
+
+from . import crud
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+RESERVATION_TTL_SECONDS = float(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_SECONDS = float(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+RESERVATION_SWEEP_BATCH = int(os.getenv("RESERVATION_SWEEP_BATCH", "500"))
+
+
+def sweep() -> bool:
+    db = SessionLocal()
+    try:
+        return crud.expire_stock_reservations(db, RESERVATION_SWEEP_BATCH) >= RESERVATION_SWEEP_BATCH
+    finally:
+        db.close()
+
+
+sweeper = PeriodicWorker("stock-reservations", sweep, interval=RESERVATION_SWEEP_SECONDS)
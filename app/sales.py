@@ -0,0 +1,98 @@
+"""Order export and pre-aggregated sales reporting.
+
+Reports read sales_daily / product_sales_daily, which the worker here keeps
+up to date by folding in new payments (crud.roll_up_sales), so a year of daily
+revenue is a few hundred rows rather than a scan of every order. Only paid
+(COMPLETED) orders count, on the day they were paid. After a
+backfill or a manual correction the rollups can be recounted::
+
+    python -m app.cli rebuild-sales
+
+Exports stream orders and their lines from a server-side cursor, so memory
+stays flat however many orders match.
+"""
+
+import csv
+import io
+import itertools
+import os
+
+from . import crud, serialization
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+SALES_ROLLUP_SECONDS = float(os.getenv("SALES_ROLLUP_SECONDS", "60"))
+SALES_BATCH_SIZE = int(os.getenv("SALES_BATCH_SIZE", "1000"))
+SALES_GRACE_SECONDS = float(os.getenv("SALES_GRACE_SECONDS", "30"))
+EXPORT_BATCH_SIZE = int(os.getenv("ORDER_EXPORT_BATCH_SIZE", "1000"))
+
+FORMATS = ("csv", "jsonl")
+ORDER_FIELDS = ("id", "date", "status", "user_id", "total_cost", "paypal_order_id")
+LINE_FIELDS = ("product_id", "quantity", "unit_price")
+
+
+def roll_up() -> bool:
+    db = SessionLocal()
+    try:
+        return crud.roll_up_sales(db, SALES_BATCH_SIZE, SALES_GRACE_SECONDS) >= SALES_BATCH_SIZE
+    finally:
+        db.close()
+
+
+def rebuild() -> dict:
+    """Recount the sales rollups from every payment (up to the grace period)."""
+    db = SessionLocal()
+    try:
+        if not crud.reset_sales_rollups(db):
+            raise RuntimeError("Sales rollups are being updated by another worker; try again")
+        orders = 0
+        while True:
+            processed = crud.roll_up_sales(db, SALES_BATCH_SIZE, SALES_GRACE_SECONDS)
+            orders += processed
+            if processed < SALES_BATCH_SIZE:
+                return {"orders": orders}
+    finally:
+        db.close()
+
+
+worker = PeriodicWorker("sales-rollup", roll_up, interval=SALES_ROLLUP_SECONDS)
+
+
+def export_orders(db, fmt: str, status=None, start=None, end=None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield matching orders as CSV text (one row per order line) or JSONL bytes (one order per line)."""
+    query = crud.order_export_query(status, start, end).execution_options(stream_results=True, yield_per=batch_size)
+    rows = db.execute(query)
+    width = len(ORDER_FIELDS)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ORDER_FIELDS + LINE_FIELDS)
+        for block in rows.partitions():
+            writer.writerows(block)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        # Lines of one order are adjacent (ordered by order id), so group on the fly
+        out = []
+        for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            order = dict(zip(ORDER_FIELDS, group[0][:width]))
+            order["products"] = [dict(zip(LINE_FIELDS, row[width:])) for row in group if row[width] is not None]
+            out.append(serialization.dumps(order) + b"\n")
+            if len(out) >= batch_size:
+                yield b"".join(out)
+                out = []
+        if out:
+            yield b"".join(out)
+
+
+def stream_export(fmt: str, **filters):
+    """export_orders on its own session, for StreamingResponse (outlives the request's session)."""
+    db = SessionLocal()
+    try:
+        yield from export_orders(db, fmt, **filters)
+    finally:
+        db.close()
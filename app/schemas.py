@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 class UserBase(BaseModel):
     email: str
@@ -97,6 +97,43 @@ class Product(ProductBase):
         allow_population_by_field_name = True
 
 
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+
+class CategoryFacetCount(BaseModel):
+    id: int
+    name: str
+    count: int
+
+
+class ProductSearchFacets(BaseModel):
+    type: List[FacetCount] = Field(default_factory=list)
+    category: List[CategoryFacetCount] = Field(default_factory=list)
+    rarity: List[FacetCount] = Field(default_factory=list)
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+class ProductSearchResult(BaseModel):
+    total: int
+    items: List[Product] = Field(default_factory=list)
+    facets: ProductSearchFacets
+
+
+class CatalogImportError(BaseModel):
+    line: int
+    error: str
+
+
+class CatalogImportResult(BaseModel):
+    inserted: int
+    updated: int
+    error_count: int
+    errors: List[CatalogImportError] = Field(default_factory=list)
+
+
 # Admin field updates
 class ProductVisibilityUpdate(BaseModel):
     is_visible: bool
@@ -110,6 +147,30 @@ class ProductDiscountUpdate(BaseModel):
     mode: str = Field(..., description="percent or amount")
     value: float = Field(..., description="percentage (0-100) or absolute amount")
 
+
+# Bulk admin updates: the same payloads applied to a selection of products
+# (criteria are combined with AND; at least one is required)
+class ProductSelection(BaseModel):
+    ids: Optional[List[int]] = None
+    category_id: Optional[int] = None
+    product_type: Optional[str] = Field(None, description="3d, card or manual")
+
+
+class ProductBulkVisibilityUpdate(ProductVisibilityUpdate, ProductSelection):
+    pass
+
+
+class ProductBulkPriceUpdate(ProductPriceUpdate, ProductSelection):
+    pass
+
+
+class ProductBulkDiscountUpdate(ProductDiscountUpdate, ProductSelection):
+    pass
+
+
+class BulkUpdateResult(BaseModel):
+    updated: int
+
 class Product3DCreate(ProductBase):
     height: float
     length: float
@@ -135,6 +196,14 @@ class Category(CategoryBase):
     class Config:
         orm_mode = True
 
+# Lightweight category listing for menus (no embedded products)
+class CategorySummary(CategoryBase):
+    id: int
+    product_count: int
+
+    class Config:
+        orm_mode = True
+
 class OrderProductBase(BaseModel):
     product_id: int
     quantity: int
@@ -160,6 +229,38 @@ class Order(OrderBase):
     class Config:
         orm_mode = True
 
+# Sales reports count paid (COMPLETED) orders only, on the day they were paid
+class DailySales(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: float
+
+
+class DailySalesReport(BaseModel):
+    as_of: Optional[datetime]  # last rollup pass; orders placed since are not counted yet
+    days: List[DailySales] = Field(default_factory=list)
+
+
+class ProductSales(BaseModel):
+    product_id: int
+    name: str
+    units: int
+    revenue: float
+
+
+class ProductSalesReport(BaseModel):
+    as_of: Optional[datetime]
+    products: List[ProductSales] = Field(default_factory=list)
+
+class CacheEntryStatus(BaseModel):
+    key: str
+    refreshed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None  # how long the last refresh took
+    size_bytes: Optional[int] = None
+    refreshing: bool = False
+
 class CartBase(BaseModel):
     user_id: int
     product_id: int
@@ -172,6 +273,33 @@ class Cart(CartBase):
     class Config:
         orm_mode = True
 
+class CartSummaryItem(BaseModel):
+    cart_id: int
+    product_id: int
+    name: str
+    quantity: int
+    price: float
+    discount: Optional[float] = None
+    discounted_price: Optional[float] = None
+    unit_price: float
+    line_total: float
+    available: bool  # visible and enough stock for the requested quantity
+
+class CartSummary(BaseModel):
+    items: List[CartSummaryItem] = Field(default_factory=list)
+    item_count: int
+    subtotal: float  # before discounts
+    discount_total: float
+    total: float
+
+class CartOperation(BaseModel):
+    op: str = Field(..., description="add, update or remove")
+    product_id: int
+    quantity: Optional[int] = None  # add: amount to add; update: new quantity (0 removes)
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation]
+
 class GuestOrderBase(BaseModel):
     guest_email: str
     guest_address: str
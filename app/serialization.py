@@ -0,0 +1,97 @@
+"""Fast JSON rendering for API responses.
+
+FastJSONResponse is the app's default response class: it renders with
+orjson when installed (datetimes natively, Decimal as float like
+FastAPI's encoder) and falls back to the standard json module.
+
+Routes declared with a ``response_model`` still validate and encode their
+return value through pydantic before rendering. The hot list endpoints skip
+that step by returning ``FastJSONResponse(product_rows(products))``: the
+rows are built straight from the loaded ORM objects in the shape of
+schemas.Product, which stays the declared response_model for the OpenAPI
+schema.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; the json module is used instead
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+else:
+
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def media_row(media) -> dict:
+    """schemas.ProductMedia as a plain dict (no ``data`` column access)."""
+    return {
+        "product_id": media.product_id,
+        "kind": media.kind,
+        "filename": media.filename,
+        "content_type": media.content_type,
+        "role": media.role,
+        "id": media.id,
+    }
+
+
+def product_row(product) -> dict:
+    """schemas.Product as a plain dict; subtype columns missing on the instance are None."""
+    get = getattr
+    return {
+        "name": product.name,
+        "product_type": product.type,
+        "quantity": product.quantity,
+        "price": _float(product.price),
+        "discount": _float(product.discount),
+        "discounted_price": _float(product.discounted_price),
+        "is_visible": product.is_visible,
+        "id": product.id,
+        "created_at": product.created_at,
+        "view_count": product.view_count,
+        "sold_count": product.sold_count,
+        "last_viewed_at": product.last_viewed_at,
+        "height": _float(get(product, "height", None)),
+        "length": _float(get(product, "length", None)),
+        "width": _float(get(product, "width", None)),
+        "series": get(product, "series", None),
+        "rarity": get(product, "rarity", None),
+        "condition": get(product, "condition", None),
+        "page_count": get(product, "page_count", None),
+        "language": get(product, "language", None),
+        "format": get(product, "format", None),
+        "media": [media_row(m) for m in product.media],
+    }
+
+
+def product_rows(products) -> list:
+    return [product_row(p) for p in products]
@@ -0,0 +1,155 @@
+"""SQL statement recording for query budgets and N+1 detection.
+
+Statements executed on an instrumented engine are attributed to every
+recorder active in the current context (request, test block, ...)::
+
+    with record_queries() as stats:
+        client.get("/products/")
+    assert stats.count <= 6, stats.report()
+
+Tests can load this module as a pytest plugin (``pytest_plugins =
+["app.sqlstats"]``) to get the ``query_budget`` fixture, and setting
+``SQL_DEBUG=1`` enables QueryBudgetMiddleware in app/main.py, which logs
+requests that exceed ``SQL_QUERY_BUDGET`` statements or repeat the same
+statement ``SQL_REPEAT_THRESHOLD`` times.
+"""
+
+import contextvars
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from .database import engine as default_engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+SQL_DEBUG = os.getenv("SQL_DEBUG", "0").lower() in ("1", "true", "yes")
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "20"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+
+# Recorders active in the current context; a tuple so nested blocks all see
+# the statements and copying the context into worker threads is cheap.
+_active = contextvars.ContextVar("sqlstats_active", default=())
+_instrumented = set()
+
+
+class QueryStats:
+    """Statements (or only counts, with keep_statements=False) seen while active."""
+
+    __slots__ = ("count", "duration", "statements", "keep_statements")
+
+    def __init__(self, keep_statements: bool = True):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.keep_statements = keep_statements
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        if self.keep_statements:
+            self.statements.append((statement, duration))
+
+    def repeated(self, threshold: int = 2):
+        """Statements executed at least ``threshold`` times, most frequent first."""
+        counts = Counter(statement for statement, _ in self.statements)
+        return [(statement, n) for statement, n in counts.most_common() if n >= threshold]
+
+    def report(self, limit: int = 5) -> str:
+        lines = [f"{self.count} statements in {self.duration * 1000:.1f} ms"]
+        for statement, n in self.repeated()[:limit]:
+            lines.append(f"  {n}x {' '.join(statement.split())[:200]}")
+        return "\n".join(lines)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault("sqlstats_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recorders = _active.get()
+    if not recorders:
+        return
+    starts = conn.info.get("sqlstats_start")
+    duration = time.perf_counter() - starts.pop() if starts else 0.0
+    for stats in recorders:
+        stats.record(statement, duration)
+
+
+def instrument(engine=None):
+    """Attach the recording hooks to ``engine``, by default the primary and read engines (idempotent)."""
+    for target in (engine,) if engine is not None else (default_engine, read_engine):
+        if id(target) in _instrumented:
+            continue
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        _instrumented.add(id(target))
+
+
+def start_recording(stats: QueryStats):
+    """Activate ``stats`` in the current context; pass the token to stop_recording."""
+    return _active.set(_active.get() + (stats,))
+
+
+def stop_recording(token):
+    _active.reset(token)
+
+
+@contextmanager
+def record_queries(engine=None, keep_statements: bool = True):
+    instrument(engine)
+    stats = QueryStats(keep_statements=keep_statements)
+    token = start_recording(stats)
+    try:
+        yield stats
+    finally:
+        stop_recording(token)
+
+
+@contextmanager
+def assert_max_queries(budget: int, engine=None):
+    """Fail with the offending statements if the block runs more than ``budget`` statements."""
+    with record_queries(engine) as stats:
+        yield stats
+    assert stats.count <= budget, f"Query budget of {budget} exceeded: {stats.report()}"
+
+
+class QueryBudgetMiddleware:
+    """Dev-mode ASGI middleware logging requests that look like N+1 offenders."""
+
+    def __init__(self, app, budget: int = SQL_QUERY_BUDGET, repeat_threshold: int = SQL_REPEAT_THRESHOLD):
+        self.app = app
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        instrument()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = start_recording(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stop_recording(token)
+            repeated = stats.repeated(self.repeat_threshold)
+            if stats.count > self.budget or repeated:
+                logger.warning("%s %s: %s", scope["method"], scope["path"], stats.report())
+
+
+# Only define the fixture when running under pytest; importing pytest costs
+# ~150 ms of app startup otherwise.
+pytest = sys.modules.get("pytest")
+
+if pytest is not None:
+
+    @pytest.fixture
+    def query_budget():
+        """``with query_budget(6): client.get("/products/")`` fails if more statements run."""
+        return assert_max_queries
@@ -0,0 +1,89 @@
+"""Background processing of queued PayPal webhook events.
+
+The HTTP endpoint only stores the raw delivery (see crud.enqueue_webhook_event)
+and acks; the worker pool here verifies the signature, applies the event and
+retries failures with exponential backoff.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+from . import crud
+from .background import PeriodicWorker
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "10"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "5"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "5"))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "3600"))
+
+
+def retry_delay(attempts: int) -> float:
+    return min(WEBHOOK_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)), WEBHOOK_BACKOFF_MAX_SECONDS)
+
+
+def handle_event(db: Session, body: dict):
+    event_type = body.get("event_type")
+    if event_type == "CHECKOUT.ORDER.APPROVED":
+        order_id = body["resource"]["id"]
+        order = crud.get_order_by_paypal_id(db, order_id)
+        if order and order.status != "COMPLETED":  # deliveries can arrive out of order
+            crud.update_order_status(db, order.id, "APPROVED")
+    elif event_type == "PAYMENT.CAPTURE.COMPLETED":
+        related = body["resource"].get("supplementary_data", {}).get("related_ids", {})
+        order_id = related.get("order_id")
+        if order_id:
+            order = crud.get_order_by_paypal_id(db, order_id)
+            if order and order.status != "COMPLETED":
+                # Stock held at checkout becomes sold, committed together with the status
+                retaken = crud.mark_order_paid(db, order.id)
+                if retaken:
+                    logger.warning("Order %s was paid after its stock hold lapsed; took %d units from stock again", order.id, retaken)
+
+
+def process_event(db: Session, event_pk: int, attempts: int, headers: str, body: str):
+    from . import paypal  # imported on first event rather than at app boot
+    try:
+        payload = json.loads(body)
+        if not paypal.verify_webhook(json.loads(headers), payload, raw_body=body.encode("utf-8")):
+            crud.finish_webhook_event(db, event_pk, "invalid", error="signature verification failed")
+            return
+        # Dedupe only now that the delivery is known to be genuine
+        if crud.webhook_event_processed(db, payload.get("id")):
+            crud.finish_webhook_event(db, event_pk, "duplicate")
+            return
+        handle_event(db, payload)
+    except Exception as e:
+        db.rollback()
+        error = f"{type(e).__name__}: {e}"
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            logger.error("Webhook event %s failed permanently: %s", event_pk, error)
+            crud.finish_webhook_event(db, event_pk, "failed", error=error)
+        else:
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+            crud.finish_webhook_event(db, event_pk, "pending", error=error, retry_at=retry_at)
+        return
+    crud.finish_webhook_event(db, event_pk, "done")
+
+
+def process_due_events(batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    """Claim and process one batch of due events; returns how many were claimed."""
+    db = SessionLocal()
+    try:
+        claimed = crud.claim_webhook_events(db, batch_size, WEBHOOK_LEASE_SECONDS)
+        for event_pk, attempts, headers, body in claimed:
+            process_event(db, event_pk, attempts, headers, body)
+        return len(claimed)
+    finally:
+        db.close()
+
+
+workers = PeriodicWorker("paypal-webhooks", process_due_events, WEBHOOK_POLL_SECONDS, threads=WEBHOOK_WORKERS)
@@ -0,0 +1,285 @@
+"""Drive the key shop flows and report throughput, latency percentiles and memory.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.load --duration 10 --output bench.json
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.load --compare bench.json
+
+Without --base-url the app is started in-process under uvicorn on a free
+port, so per-scenario server memory (RSS growth) can be reported; with
+--base-url an already running server is driven instead. DATABASE_URL must
+point at the seeded database either way, to pick product, media and user
+ids. Results are written as JSON with the git commit, so runs on different
+commits can be compared with --compare. The in-process server runs with
+per-client rate limits off (RATE_LIMITS_ENABLED=0), since every simulated
+user shares one client address; set it explicitly to measure with them.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from app import models
+from app.database import SessionLocal, engine
+from .seed import BENCH_PASSWORD
+
+SCENARIOS = ("browse", "highlighted", "product_view", "media", "login", "cart", "guest_checkout")
+
+
+class Context:
+    """Ids sampled from the seeded database, shared by all scenarios."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        db = SessionLocal()
+        try:
+            self.product_ids = [pid for (pid,) in db.query(models.Product.id).filter(models.Product.is_visible == True).limit(5000)]
+            self.buyable_ids = [
+                pid for (pid,) in db.query(models.Product.id)
+                .filter(models.Product.is_visible == True, models.Product.quantity > 5)
+                .limit(5000)
+            ]
+            self.media_ids = [mid for (mid,) in db.query(models.ProductMedia.id).limit(5000)]
+            self.users = [email for (email,) in db.query(models.User.email).filter(models.User.email.like("bench%@example.com")).limit(500)]
+            self.visible_count = len(self.product_ids)
+        finally:
+            db.close()
+        if not (self.product_ids and self.media_ids and self.users):
+            raise SystemExit("Database is not seeded; run `python -m benchmarks.seed` first")
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+
+def _login(session: requests.Session, ctx: Context, rng: random.Random) -> str:
+    r = session.post(ctx.url("/token"), data={"username": rng.choice(ctx.users), "password": BENCH_PASSWORD})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+# Each scenario performs one user-level operation (possibly several requests)
+
+def browse(session, ctx, rng, state):
+    skip = rng.randrange(0, max(1, ctx.visible_count - 20))
+    session.get(ctx.url("/products/"), params={"skip": skip, "limit": 20}).raise_for_status()
+
+
+def highlighted(session, ctx, rng, state):
+    session.get(ctx.url("/products/highlighted"), params={"limit": 12}).raise_for_status()
+
+
+def product_view(session, ctx, rng, state):
+    pid = rng.choice(ctx.product_ids)
+    session.get(ctx.url(f"/products/{pid}")).raise_for_status()
+    session.post(ctx.url(f"/products/{pid}/view")).raise_for_status()
+
+
+def media(session, ctx, rng, state):
+    session.get(ctx.url(f"/media/{rng.choice(ctx.media_ids)}")).raise_for_status()
+
+
+def login(session, ctx, rng, state):
+    _login(session, ctx, rng)
+
+
+def cart(session, ctx, rng, state):
+    if "token" not in state:
+        state["token"] = _login(session, ctx, rng)
+    headers = {"Authorization": f"Bearer {state['token']}"}
+    picks = rng.sample(ctx.buyable_ids, k=min(3, len(ctx.buyable_ids)))
+    ops = [{"op": "add", "product_id": pid, "quantity": 1} for pid in picks]
+    session.post(ctx.url("/cart/batch"), json={"operations": ops}, headers=headers).raise_for_status()
+    session.get(ctx.url("/cart/summary"), headers=headers).raise_for_status()
+    ops = [{"op": "remove", "product_id": pid} for pid in picks]
+    session.post(ctx.url("/cart/batch"), json={"operations": ops}, headers=headers).raise_for_status()
+
+
+def guest_checkout(session, ctx, rng, state):
+    picks = rng.sample(ctx.buyable_ids, k=min(rng.randint(1, 3), len(ctx.buyable_ids)))
+    payload = {
+        "guest_email": f"loadtest{rng.randint(0, 10**6)}@example.com",
+        "guest_address": "1 Bench Street",
+        "total_cost": 10.0 * len(picks),
+        "status": "CREATED",
+        "products": [{"product_id": pid, "quantity": 1} for pid in picks],
+    }
+    session.post(ctx.url("/guest_orders/"), json=payload).raise_for_status()
+
+
+def _percentile(sorted_values, pct: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def run_scenario(name: str, ctx: Context, duration: float, concurrency: int, warmup: float, seed_value: int, in_process: bool):
+    func = globals()[name]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline_box = [None]
+
+    def worker(n: int):
+        rng = random.Random(f"{seed_value}-{name}-{n}")
+        session = requests.Session()
+        state = {}
+        local = []
+        local_errors = 0
+        warm_until = time.perf_counter() + warmup
+        while time.perf_counter() < warm_until:
+            try:
+                func(session, ctx, rng, state)
+            except Exception:
+                pass
+        while deadline_box[0] is None:
+            time.sleep(0.001)
+        while True:
+            start = time.perf_counter()
+            if start >= deadline_box[0]:
+                break
+            try:
+                func(session, ctx, rng, state)
+                local.append(time.perf_counter() - start)
+            except Exception:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    time.sleep(warmup)
+    rss_before = _rss_bytes() if in_process else None
+    started = time.perf_counter()
+    deadline_box[0] = started + duration
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_bytes() if in_process else None
+
+    latencies.sort()
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "operations": len(latencies),
+        "errors": errors[0],
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "rss_mb": round(rss_after / 2**20, 1) if rss_after else None,
+        "rss_growth_mb": round((rss_after - rss_before) / 2**20, 1) if rss_after and rss_before else None,
+    }
+
+
+def _start_server():
+    import uvicorn
+
+    os.environ.setdefault("RATE_LIMITS_ENABLED", "0")
+    from app.main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results: dict, baseline=None):
+    header = f"{'scenario':<16}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}"
+    if baseline:
+        header += f"{'Δ ops/s':>10}{'Δ p95':>9}"
+    print(header)
+    for name, r in results.items():
+        line = f"{name:<16}{r['throughput']:>10}{str(r['p50_ms']):>10}{str(r['p95_ms']):>10}{str(r['p99_ms']):>10}{r['errors']:>8}{str(r['rss_mb']):>9}"
+        base = (baseline or {}).get(name)
+        if base and base.get("throughput") and base.get("p95_ms") and r["p95_ms"]:
+            line += f"{(r['throughput'] / base['throughput'] - 1) * 100:>+9.1f}%"
+            line += f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:>+8.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-url", help="drive a running server instead of starting one in-process")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from an earlier run to diff against")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, thread, base_url = _start_server()
+    try:
+        ctx = Context(base_url)
+        results = {}
+        for name in names:
+            results[name] = run_scenario(name, ctx, args.duration, args.concurrency, args.warmup, args.seed, in_process=server is not None)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(10)
+
+    report = {
+        "commit": _git_commit(),
+        "database": engine.dialect.name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {"duration": args.duration, "warmup": args.warmup, "concurrency": args.concurrency, "seed": args.seed},
+        "scenarios": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("scenarios")
+    _print_table(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
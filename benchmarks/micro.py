@@ -0,0 +1,198 @@
+"""Micro-benchmarks for hot pure-Python paths, with regression thresholds.
+
+    python -m benchmarks.micro                  # run and print timings
+    python -m benchmarks.micro --check          # exit 1 if any bench is >20% slower than baseline
+    python -m benchmarks.micro --update         # store current timings as the baseline
+
+Timings are per operation (best of --repeat rounds) and compared with
+benchmarks/micro_baseline.json. Baselines are machine specific: refresh
+them with --update on the machine that runs --check.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+from jose import jwt
+
+from app import auth, crud, schemas, serialization
+from app.security import hash_password, verify_password
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "micro_baseline.json")
+
+BENCHMARKS = {}
+
+
+def bench(name: str, number: int):
+    """Register ``setup`` returning a zero-arg callable; ``number`` calls form one round."""
+    def register(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return register
+
+
+def _product_rows(n: int, rng: random.Random):
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=i,
+            view_count=rng.randint(0, 5000),
+            sold_count=rng.randint(0, 300),
+            price=Decimal(str(round(rng.uniform(1, 500), 2))),
+            discount=Decimal(str(round(rng.uniform(0, 50), 2))) if rng.random() < 0.3 else None,
+            created_at=now - timedelta(days=rng.randint(0, 400)),
+        )
+        for i in range(n)
+    ]
+
+
+def _product_objects(n: int, rng: random.Random):
+    now = datetime.utcnow()
+    products = []
+    for i in range(n):
+        price = Decimal(str(round(rng.uniform(1, 500), 2)))
+        products.append(SimpleNamespace(
+            id=i, name=f"Product {i}", type="card", product_type="card", quantity=5, price=price,
+            discount=None, discounted_price=None, is_visible=True,
+            view_count=10, sold_count=2, last_viewed_at=now, created_at=now,
+            height=None, length=None, width=None,
+            series="Base Set", rarity="rare", condition="mint",
+            page_count=None, language=None, format=None,
+            media=[
+                SimpleNamespace(id=i * 2 + k, product_id=i, kind="image", role="gallery",
+                                filename=f"{i}-{k}.png", content_type="image/png")
+                for k in range(2)
+            ],
+        ))
+    return products
+
+
+def _from_orm(model, obj):
+    if hasattr(model, "model_validate"):  # pydantic 2
+        return model.model_validate(obj, from_attributes=True)
+    return model.from_orm(obj)
+
+
+@bench("compute_discounted_price", number=20000)
+def _discounted_price():
+    price, discount = Decimal("129.99"), Decimal("17.35")
+    return lambda: crud._compute_discounted_price(price, discount)
+
+
+@bench("highlight_scoring_10k", number=5)
+def _highlight_scoring():
+    import heapq
+    rows = _product_rows(10000, random.Random(1))
+    now = datetime.utcnow()
+    return lambda: heapq.nlargest(12, rows, key=lambda p: crud.highlight_score(p, now))
+
+
+@bench("product_serialization_page_100", number=5)
+def _product_serialization():
+    products = _product_objects(100, random.Random(2))
+    return lambda: jsonable_encoder([_from_orm(schemas.Product, p) for p in products])
+
+
+@bench("product_response_default_page_100", number=5)
+def _product_response_default():
+    # What a response_model route does: validate, encode, then json.dumps
+    from fastapi.responses import JSONResponse
+    products = _product_objects(100, random.Random(2))
+    return lambda: JSONResponse(jsonable_encoder([_from_orm(schemas.Product, p) for p in products])).body
+
+
+@bench("product_response_fast_page_100", number=20)
+def _product_response_fast():
+    products = _product_objects(100, random.Random(2))
+    return lambda: serialization.FastJSONResponse(serialization.product_rows(products)).body
+
+
+@bench("jwt_encode_decode", number=2000)
+def _jwt_roundtrip():
+    def run():
+        token = auth.create_access_token({"sub": "bench@example.com"})
+        jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    return run
+
+
+@bench("bcrypt_verify", number=1)
+def _bcrypt_verify():
+    hashed = hash_password("bench-password")
+    return lambda: verify_password("bench-password", hashed)
+
+
+def measure(name: str, repeat: int) -> float:
+    """Best per-operation time in seconds over ``repeat`` rounds."""
+    setup, number = BENCHMARKS[name]
+    func = setup()
+    func()  # warm caches and lazy imports
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _format(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update", action="store_true", help="write current timings as the baseline")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed slowdown in percent")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("benchmarks", {})
+
+    results = {}
+    regressions = []
+    for name in names:
+        seconds = measure(name, args.repeat)
+        results[name] = seconds
+        line = f"{name:<34}{_format(seconds):>14}"
+        base = baseline.get(name)
+        if base:
+            change = (seconds / base - 1) * 100
+            line += f"   {change:+6.1f}% vs baseline {_format(base)}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "   REGRESSION"
+        print(line)
+
+    if args.update:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "benchmarks": baseline}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if args.check and regressions:
+        print(f"Regressed by more than {args.threshold:g}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Seed a synthetic catalog for benchmarking.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed --products 5000
+
+Creates the schema if needed, then bulk-inserts products of every subtype,
+categories, media blobs, users and guest orders. Data is derived from
+--seed, so two runs with the same arguments produce the same catalog.
+Benchmark users log in as bench<N>@example.com / BENCH_PASSWORD.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from app import models
+from app.database import SessionLocal, engine
+from app.security import hash_password
+
+BENCH_PASSWORD = "bench-password"
+BATCH = 1000
+
+SUBTYPES = ("3d", "card", "manual")
+RARITIES = ("common", "uncommon", "rare", "holo", "secret")
+SERIES = ("Base Set", "Jungle", "Fossil", "Team Rocket", "Neo Genesis")
+LANGUAGES = ("en", "de", "fr", "ja")
+WORDS = (
+    "dragon", "knight", "castle", "robot", "ship", "tower", "wizard", "forest",
+    "golem", "phoenix", "titan", "racer", "guardian", "sentinel", "relic", "beacon",
+)
+
+
+def _chunks(rows, size=BATCH):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _blob(rng: random.Random, size: int) -> bytes:
+    # Half random, half repetitive: compresses roughly like real GLB/PDF files
+    noise = rng.randbytes(size // 2)
+    pattern = bytes(range(256)) * (size // 512 + 1)
+    return noise + pattern[: size - len(noise)]
+
+
+def _product_row(rng: random.Random, i: int, kind: str, now: datetime) -> dict:
+    price = round(rng.uniform(2, 400), 2)
+    discount = round(price * rng.choice((0, 0, 0, 0.1, 0.25)), 2) or None
+    row = {
+        "type": kind,
+        "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{i}",
+        "quantity": rng.randint(0, 50),
+        "price": price,
+        "discount": discount,
+        "discounted_price": round(price - discount, 2) if discount else None,
+        "is_visible": rng.random() > 0.05,
+        "view_count": int(rng.paretovariate(1.2) * 10),
+        "sold_count": int(rng.paretovariate(1.5)),
+        "created_at": now - timedelta(days=rng.randint(0, 365)),
+    }
+    if kind == "3d":
+        row.update(height=round(rng.uniform(1, 50), 2), length=round(rng.uniform(1, 50), 2), width=round(rng.uniform(1, 50), 2))
+    elif kind == "card":
+        row.update(series=rng.choice(SERIES), rarity=rng.choice(RARITIES), condition=rng.choice(("mint", "near mint", "played")))
+    else:
+        row.update(page_count=rng.randint(4, 300), language=rng.choice(LANGUAGES), format=rng.choice(("pdf", "epub")))
+    return row
+
+
+def seed(products: int, categories: int, users: int, orders: int, media_kb: int, seed_value: int = 42):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        first_product_id = (db.query(func.max(models.Product.id)).scalar() or 0) + 1
+
+        by_kind = {kind: [] for kind in SUBTYPES}
+        for i in range(products):
+            kind = SUBTYPES[i % len(SUBTYPES)]
+            by_kind[kind].append(_product_row(rng, i, kind, now))
+        mapper = {"3d": models.ThreeDModel, "card": models.Card, "manual": models.Manual}
+        for kind, rows in by_kind.items():
+            for chunk in _chunks(rows):
+                db.execute(insert(mapper[kind]), chunk)
+        db.commit()
+        product_ids = [pid for (pid,) in db.query(models.Product.id).filter(models.Product.id >= first_product_id)]
+
+        category_rows = [{"name": f"Bench category {seed_value}-{i}"} for i in range(categories)]
+        category_ids = []
+        if category_rows:
+            db.execute(insert(models.Category), category_rows)
+            db.commit()
+            names = [row["name"] for row in category_rows]
+            category_ids = [cid for (cid,) in db.query(models.Category.id).filter(models.Category.name.in_(names))]
+            links = []
+            for pid in product_ids:
+                for cid in rng.sample(category_ids, k=min(len(category_ids), rng.randint(1, 3))):
+                    links.append({"product_id": pid, "category_id": cid})
+            for chunk in _chunks(links):
+                db.execute(models.product_categories.insert(), chunk)
+            db.commit()
+
+        # Every product gets a small thumbnail; a third also get a large model/manual file
+        thumbnail = _blob(rng, 24 * 1024)
+        large = _blob(rng, media_kb * 1024)
+        media = []
+        for n, pid in enumerate(product_ids):
+            media.append({"product_id": pid, "kind": "image", "role": "thumbnail", "filename": f"{pid}.png", "content_type": "image/png", "data": thumbnail})
+            if n % 3 == 0:
+                media.append({"product_id": pid, "kind": "model", "role": "source", "filename": f"{pid}.glb", "content_type": "model/gltf-binary", "data": large})
+            if len(media) >= 200:
+                db.execute(insert(models.ProductMedia), media)
+                db.commit()
+                media = []
+        if media:
+            db.execute(insert(models.ProductMedia), media)
+            db.commit()
+
+        password = hash_password(BENCH_PASSWORD)  # hashed once; bcrypt per user would dominate seeding
+        existing = {email for (email,) in db.query(models.User.email).filter(models.User.email.like("bench%@example.com"))}
+        user_rows = [
+            {"email": f"bench{i}@example.com", "password": password, "is_admin": False, "created_at": now}
+            for i in range(users)
+            if f"bench{i}@example.com" not in existing
+        ]
+        for chunk in _chunks(user_rows):
+            db.execute(insert(models.User), chunk)
+        db.commit()
+
+        for chunk_start in range(0, orders, BATCH):
+            order_rows = []
+            for _ in range(min(BATCH, orders - chunk_start)):
+                order_rows.append({
+                    "guest_email": f"guest{rng.randint(0, 10**6)}@example.com",
+                    "guest_address": "1 Bench Street",
+                    "total_cost": round(rng.uniform(5, 500), 2),
+                    "status": rng.choice(("CREATED", "APPROVED", "COMPLETED")),
+                    "date": now - timedelta(days=rng.randint(0, 365)),
+                })
+            order_ids = db.execute(insert(models.Order).returning(models.Order.id, sort_by_parameter_order=True), order_rows).scalars().all()
+            lines = []
+            for oid in order_ids:
+                for pid in rng.sample(product_ids, k=min(len(product_ids), rng.randint(1, 4))):
+                    lines.append({"order_id": oid, "product_id": pid, "quantity": rng.randint(1, 3)})
+            db.execute(insert(models.OrderProduct), lines)
+            db.commit()
+
+        return {
+            "products": len(product_ids),
+            "categories": len(category_ids),
+            "users": len(user_rows),
+            "orders": orders,
+            "seconds": round(time.perf_counter() - start, 2),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=3000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--media-kb", type=int, default=512, help="size of large media files (models, manuals)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(f"Seeding {os.getenv('DATABASE_URL', 'default database')} ...")
+    print(seed(args.products, args.categories, args.users, args.orders, args.media_kb, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure worker boot time against a budget.
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.startup --budget-ms 1500
+
+Each run is a fresh interpreter that imports app.main and runs the startup
+handlers, as a new uvicorn/gunicorn worker would. Reports the median import
+and startup times, the slowest imports (from ``-X importtime``), and exits 1
+when import + startup exceeds --budget-ms.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+
+async def lifespan(app):
+    # Drive the ASGI lifespan protocol the way uvicorn does
+    events, started = asyncio.Queue(), asyncio.Event()
+    async def send(message):
+        if message["type"].startswith("lifespan.startup."):
+            started.set()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, events.get, send))
+    await events.put({"type": "lifespan.startup"})
+    await started.wait()
+    elapsed = time.perf_counter() - t1
+    await events.put({"type": "lifespan.shutdown"})
+    await task
+    return elapsed
+
+startup = asyncio.run(lifespan(app.main.app))
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": startup * 1000}))
+"""
+
+
+def _run_probe(env) -> dict:
+    out = subprocess.check_output([sys.executable, "-c", PROBE], env=env, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(env, top: int):
+    """(cumulative ms, module) for the ``top`` slowest imports under app.main."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        name = module.strip()
+        if "." not in name or name.startswith("app."):  # top-level packages and our own modules
+            rows.append((int(cumulative) / 1000, name))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="allowed median import + startup time")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    runs = [_run_probe(env) for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    startup_ms = statistics.median(r["startup_ms"] for r in runs)
+    total = import_ms + startup_ms
+
+    print(f"import app.main   {import_ms:8.1f} ms")
+    print(f"startup handlers  {startup_ms:8.1f} ms")
+    print(f"total             {total:8.1f} ms   (budget {args.budget_ms:g} ms)")
+    print("\nslowest imports (cumulative):")
+    for ms, name in slowest_imports(env, args.top):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if total > args.budget_ms:
+        print(f"\nStartup budget exceeded by {total - args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database unless DATABASE_URL says otherwise;
+# must happen before app.database is imported.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("RATE_LIMITS_ENABLED", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.database import SessionLocal, engine
+
+pytest_plugins = ["app.sqlstats"]
+
+
+@pytest.fixture(scope="session")
+def db_schema():
+    models.Base.metadata.create_all(engine)
+    yield
+    models.Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db(db_schema):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db_schema):
+    from app.main import app
+    return TestClient(app)
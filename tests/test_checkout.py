@@ -0,0 +1,31 @@
+"""Payment of an order is applied once, however many times it is reported."""
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+
+
+def test_mark_order_paid_twice_on_loaded_orders(db):
+    product = models.Card(type="card", name="checkout", quantity=5, price=10, series="s", rarity="r", condition="mint")
+    db.add(product)
+    db.commit()
+    order = crud.create_guest_order(db, schemas.GuestOrderBase(
+        guest_email="guest@example.com", guest_address="a", total_cost=20, status="CREATED",
+        products=[{"product_id": product.id, "quantity": 2}],
+    ))
+    other = SessionLocal()
+    try:
+        # Both deliveries load the order (as the webhook's paypal id lookup does) before paying it
+        assert crud.get_order(db, order.id).status == "CREATED"
+        assert crud.get_order(other, order.id).status == "CREATED"
+        assert crud.mark_order_paid(other, order.id) == 2
+        assert crud.mark_order_paid(db, order.id) is None
+        assert crud.mark_order_paid(other, order.id) is None
+    finally:
+        other.close()
+    assert db.query(models.OrderPayment).filter(models.OrderPayment.order_id == order.id).count() == 1
+    db.refresh(product)
+    assert product.quantity == 3
+    db.delete(order)
+    db.commit()
+    db.delete(product)
+    db.commit()
@@ -0,0 +1,63 @@
+"""Product list pages must run a fixed number of statements, whatever their size."""
+
+import pytest
+
+from app import crud, models, serialization
+from app.sqlstats import record_queries
+
+SUBTYPES = (
+    lambda: models.ThreeDModel(type="3d", height=1, length=2, width=3),
+    lambda: models.Card(type="card", series="s", rarity="r", condition="mint"),
+    lambda: models.Manual(type="manual", page_count=10, language="en", format="pdf"),
+)
+
+
+@pytest.fixture(scope="module")
+def catalog(db_schema):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    category = models.Category(name="query-count")
+    for i in range(60):
+        product = SUBTYPES[i % len(SUBTYPES)]()
+        product.name, product.quantity, product.price = f"product {i}", 5, 10 + i
+        product.categories.append(category)
+        product.media.append(models.ProductMedia(kind="image", filename=f"{i}.png", content_type="image/png", data=b"png"))
+        db.add(product)
+    db.commit()
+    category_id = category.id
+    db.close()
+    yield category_id
+    db = SessionLocal()
+    db.query(models.Product).delete()
+    db.query(models.Category).delete()
+    db.commit()
+    db.close()
+
+
+def _statements(fn):
+    with record_queries() as stats:
+        fn()
+    return stats.count
+
+
+@pytest.mark.parametrize("load", [
+    crud.get_visible_products,
+    crud.get_products,
+])
+def test_product_list_statements_do_not_grow_with_page_size(db, catalog, load):
+    # Serialize as the routes do, so lazily loaded columns would be counted too
+    small = _statements(lambda: serialization.product_rows(load(db, limit=5)))
+    db.expunge_all()
+    large = _statements(lambda: serialization.product_rows(load(db, limit=50)))
+    assert small == large
+
+
+def test_product_routes_run_a_constant_number_of_statements(client, catalog, query_budget):
+    for path in ("/products/", f"/categories/{catalog}/products"):
+        # Page sizes the landing cache does not serve
+        small = _statements(lambda: client.get(path, params={"limit": 5}).raise_for_status())
+        large = _statements(lambda: client.get(path, params={"limit": 50}).raise_for_status())
+        assert small == large, path
+        with query_budget(small):
+            assert len(client.get(path, params={"limit": 50}).json()) == 50
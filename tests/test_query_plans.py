@@ -0,0 +1,71 @@
+"""The hot order lookups must be served by an index, never a full scan of orders.
+
+Each check runs the real crud function, captures the SQL it emits and
+EXPLAINs it on the test database (SQLite, or Postgres with DATABASE_URL).
+"""
+
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import crud
+from app.database import engine
+
+CHECKS = {
+    "webhook lookup by paypal id": lambda db: crud.get_order_by_paypal_id(db, "PAYPAL-PLAN-CHECK"),
+    "order history for user": lambda db: crud.get_user_orders(db, user_id=1),
+    "order listing by status": lambda db: crud.get_orders(db, status="COMPLETED"),
+    "order listing": lambda db: crud.get_orders(db),
+}
+
+
+def _capture(db, func):
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return [(s, p) for s, p in captured if "FROM orders" in s]
+
+
+def _pg_seq_scans(node):
+    if node.get("Node Type") == "Seq Scan":
+        yield node.get("Relation Name")
+    for child in node.get("Plans", []):
+        yield from _pg_seq_scans(child)
+
+
+def _explain(db, statement, parameters):
+    """(plan text, set of tables read with a full scan)."""
+    cursor = db.connection().connection.cursor()
+    try:
+        if engine.dialect.name == "postgresql":
+            # Tiny tables always favour a seq scan; we only care that an index is usable
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            return json.dumps(plan, indent=2), set(_pg_seq_scans(plan))
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        lines = [str(row[-1]) for row in cursor.fetchall()]
+        scans = {line.split()[1] for line in lines if line.startswith("SCAN ") and " USING " not in line}
+        return "\n".join(lines), scans
+    finally:
+        cursor.close()
+
+
+@pytest.mark.parametrize("name", CHECKS)
+def test_order_lookup_uses_an_index(db, name):
+    statements = _capture(db, CHECKS[name])
+    assert statements, "no query on orders was captured"
+    try:
+        for statement, parameters in statements:
+            plan, scans = _explain(db, statement, parameters)
+            assert "orders" not in scans, f"{name} scans orders:\n{plan}"
+    finally:
+        db.rollback()
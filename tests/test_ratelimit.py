@@ -0,0 +1,25 @@
+"""MemoryBuckets keeps its size bounded without letting a client off its limit."""
+
+from app.ratelimit import MemoryBuckets
+
+
+def test_new_clients_do_not_reset_an_active_bucket():
+    buckets = MemoryBuckets(max_keys=10)
+    assert buckets.take("abuser", 1, 1 / 60)[0]
+    for n in range(100):
+        assert buckets.take("abuser", 1, 1 / 60)[0] is False
+        buckets.take(f"client-{n}", 5, 1 / 60)
+    assert len(buckets._buckets) <= 10
+
+
+def test_buckets_are_pruned_by_their_own_refill_time(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("app.ratelimit.time.monotonic", lambda: clock[0])
+    buckets = MemoryBuckets(max_keys=3)
+    buckets.take("slow", 1, 1 / 3600)  # refills after an hour
+    buckets.take("fast", 10, 10.0)  # refills after a second
+    buckets.take("other", 10, 10.0)
+    clock[0] = 60.0
+    buckets.take("new", 10, 10.0)
+    assert list(buckets._buckets) == ["slow", "new"]
+    assert buckets.take("slow", 1, 1 / 3600)[0] is False
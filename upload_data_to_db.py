@@ -13,9 +13,8 @@ def list_models(db: Session):
     print("\nAvailable 3D Models:")
     mapping = {}
     for m in models3d:
-        # In joined-table inheritance, ThreeDModel.id == Product.id
-        prod = db.query(models.Product).filter(models.Product.id == m.id).first()
-        name = prod.name if prod else f"Product {m.id}"
+        # Joined-table inheritance: ThreeDModel rows already carry the Product columns
+        name = m.name or f"Product {m.id}"
         print(f"{m.id}: {name}")
         mapping[str(m.id)] = name
     print("")